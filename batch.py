@@ -0,0 +1,229 @@
+import collections
+import concurrent.futures
+import functools
+import itertools
+import os
+import sys
+import traceback
+import parser
+import readers
+
+# bytes of log matched by each worker task in read_log_chunked
+chunk_size = 4 * 1024 * 1024
+
+class Result:
+    """The outcome of parsing one log file in a worker process.
+
+    'summary' holds the value returned by the reducer, or None if parsing
+    failed, in which case 'error' holds the formatted traceback.
+    """
+    __slots__ = ("path", "summary", "error")
+
+    def __init__(self, path, summary=None, error=None):
+        self.path = path
+        self.summary = summary
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return "{}(path={!r}, ok={!r})".format(
+            self.__class__.__name__,
+            self.path,
+            self.ok
+        )
+
+def summarize(world):
+    """Reduces a World to plain data small enough to send between processes.
+
+    Each counter series is reduced to its sum, keyed by str() of its key.
+    """
+    users = {}
+    for steam_id, user in world.known_users.items():
+        users[steam_id] = {
+            "name": user.name,
+            "team": user.original_team,
+            "classes": sorted(user.played_classes),
+            "counters": {
+                title: {
+                    str(key): series.sum() for key, series in counter.items()
+                } for title, counter in user.counters.items()
+            }
+        }
+    return {
+        "filename": world.filename,
+        "mapname": world.mapname,
+        "team_names": dict(world.team_names),
+        "first_timestamp": getattr(world, "first_timestamp", None),
+        "last_timestamp": getattr(world, "last_timestamp", None),
+        "users": users
+    }
+
+def parse_file(path, reducer=summarize):
+    """Parses the log at [path] into a new World.
+
+    Returns a Result holding reducer(world).  Any exception is caught and
+    recorded in the Result, so one bad log never fails a whole batch.
+    """
+    try:
+        world = parser.World()
+        for _ in world.read_log(path):
+            pass
+        return Result(path, reducer(world))
+    except Exception:
+        return Result(path, error=traceback.format_exc())
+
+def result_of(future, path):
+    """Returns the Result of a parse_file [future] for [path]"""
+    try:
+        return future.result()
+    except Exception:
+        # the worker itself died, or the result could not be pickled
+        return Result(path, error=traceback.format_exc())
+
+def parse_files(paths, workers=None, ordered=True, reducer=summarize):
+    """Parses each log in [paths] in a pool of worker processes.
+
+    Yields one Result per path: in the order of [paths] if [ordered] is
+    true, otherwise as soon as each file is done.  [workers] defaults to the
+    number of CPUs.  [reducer] turns each World into the value sent back to
+    this process; it runs in the worker, so it must be a module level
+    function, and should return something much smaller than the World.
+
+    Only a few files per worker are in flight at once, so [paths] may be
+    long or lazy.  A worker process dying (a crash, os._exit, the OOM
+    killer) breaks the whole pool and every file in flight with it, so those
+    files are parsed again one at a time in a new pool, and only the file
+    that killed its worker is recorded as failed.
+    """
+    workers = workers or os.cpu_count() or 1
+    window = 2 * workers
+    paths = iter(paths)
+    new_pool = functools.partial(
+        concurrent.futures.ProcessPoolExecutor,
+        max_workers=workers
+    )
+    broken = concurrent.futures.BrokenExecutor
+    pool = new_pool()
+    # futures in flight and their paths, in submission order
+    pending = collections.OrderedDict()
+    try:
+        while True:
+            for path in itertools.islice(paths, window - len(pending)):
+                pending[pool.submit(parse_file, path, reducer)] = path
+            if not pending:
+                return
+            if ordered:
+                future = next(iter(pending))
+            else:
+                done, _ = concurrent.futures.wait(
+                    pending,
+                    return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                future = done.pop()
+            if not isinstance(future.exception(), broken):
+                yield result_of(future, pending.pop(future))
+                continue
+            suspects = list(pending.items())
+            pending.clear()
+            pool.shutdown(wait=False)
+            pool = new_pool()
+            for future, path in suspects:
+                if isinstance(future.exception(), broken):
+                    future = pool.submit(parse_file, path, reducer)
+                    if isinstance(future.exception(), broken):
+                        pool.shutdown(wait=False)
+                        pool = new_pool()
+                yield result_of(future, path)
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+def log_files(directory):
+    """Returns the sorted paths of the files in [directory]"""
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if os.path.isfile(os.path.join(directory, name))
+    )
+
+def parse_directory(directory, **kwargs):
+    """Parses every file in [directory], see parse_files for [kwargs]"""
+    return parse_files(log_files(directory), **kwargs)
+
+def chunk_offsets(path, chunk_size=chunk_size):
+    """Returns (start, end) byte ranges of [chunk_size] covering [path]"""
+    size = os.path.getsize(path)
+    return [
+        (start, min(start + chunk_size, size))
+        for start in range(0, size, chunk_size)
+    ]
+
+def extract_chunk(path, start, end):
+    """Matches the lines of [path] which start within bytes [start, end).
+
+    Returns a list of (Line subclass, timestamp, groups) event records for
+    the matched lines, in order.  This only matches and extracts fields, it
+    needs no World, so chunks can be handled in any process.
+    """
+    events = []
+    with open(path, "rb") as f:
+        if start > 0:
+            f.seek(start - 1)
+            if f.read(1) != b"\n":
+                # this line started in, and belongs to, the previous chunk
+                f.readline()
+        position = f.tell()
+        while position < end:
+            line = f.readline()
+            if not line:
+                break
+            position += len(line)
+            found = parser.Line.match(line)
+            if found is not None:
+                subclass, timestamp, result = found
+                events.append((subclass, timestamp, result.groupdict()))
+    return events
+
+def read_log_chunked(world, path, workers=None, chunk_size=chunk_size):
+    """Parses the log at [path] into [world] in two phases.
+
+    The file is split into line aligned chunks which worker processes match
+    and extract into event records in parallel.  The events are then
+    applied to [world] here, in file order, as only that step (user lookups
+    and counter updates) needs the shared World.  Each parsed Line is
+    yielded, as with World.read_log.  Compressed logs cannot be split and
+    are parsed sequentially instead.
+    """
+    with open(path, "rb") as f:
+        compression = readers.detect_compression(f)
+    if compression is not None:
+        yield from world.read_log(path)
+        return
+    chunks = iter(chunk_offsets(path, chunk_size))
+    # keep a bounded number of chunks in flight ahead of the reduce phase
+    window = 2 * (workers or os.cpu_count() or 1)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = collections.deque(
+            pool.submit(extract_chunk, path, start, end)
+            for start, end in itertools.islice(chunks, window)
+        )
+        while pending:
+            events = pending.popleft().result()
+            for start, end in itertools.islice(chunks, 1):
+                pending.append(pool.submit(extract_chunk, path, start, end))
+            for subclass, timestamp, values in events:
+                yield subclass(world, None, timestamp, parser.Groups(values))
+
+if __name__ == "__main__":
+    directory = sys.argv[1] if len(sys.argv) > 1 else parser.World.log_directory
+    for result in parse_directory(directory, ordered=False):
+        if result.ok:
+            print("{}: {} ({} users)".format(
+                result.path,
+                result.summary["mapname"],
+                len(result.summary["users"])
+            ))
+        else:
+            print("{}: failed".format(result.path))
+            print(result.error, file=sys.stderr)
@@ -0,0 +1,168 @@
+"""An on-disk cache of parsed Worlds, keyed by the content of their logs.
+
+Each entry is a binary snapshot (see serializers) named after the sha256 of
+the log file it was parsed from and the parser and snapshot versions, so a
+log is only parsed again if it, or the parser, changed.
+"""
+import hashlib
+import os
+import tempfile
+import parser
+import serializers
+
+# default directory holding cache entries
+directory = ".tf2logs-cache"
+
+# default total size in bytes of the entries kept
+max_bytes = 256 * 1024 * 1024
+
+# size in bytes of the reads used to hash log files
+hash_buffer_size = 1024 * 1024
+
+# suffix of cache entry file names
+entry_suffix = ".world"
+
+def content_hash(path):
+    """Returns the sha256 hex digest of the file at [path]"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(hash_buffer_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class Cache:
+    """Parsed Worlds stored in [directory], at most [max_bytes] of them.
+
+    When the entries grow past [max_bytes], the least recently used ones are
+    evicted; every hit refreshes the modification time of its entry, which
+    is what recency is judged by.
+    """
+    def __init__(self, directory=directory, max_bytes=max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, path):
+        """Returns the cache key of the log file at [path]"""
+        return "{}-p{}-s{}".format(
+            content_hash(path),
+            parser.parser_version,
+            serializers.binary_version
+        )
+
+    def entry(self, key):
+        return os.path.join(self.directory, key + entry_suffix)
+
+    def get(self, path, key=None):
+        """Returns the cached World for the log at [path], or None"""
+        entry = self.entry(key or self.key(path))
+        try:
+            with open(entry, "rb") as f:
+                world = serializers.load_binary(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except ValueError:
+            # damaged or foreign, it will be replaced
+            self.misses += 1
+            return None
+        try:
+            os.utime(entry)
+        except FileNotFoundError:
+            # evicted meanwhile
+            pass
+        self.hits += 1
+        return world
+
+    def put(self, path, world, key=None):
+        """Stores [world] as parsed from the log at [path]"""
+        os.makedirs(self.directory, exist_ok=True)
+        entry = self.entry(key or self.key(path))
+        fd, temporary = tempfile.mkstemp(
+            prefix=".",
+            suffix=entry_suffix,
+            dir=self.directory
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                serializers.dump_binary(world, f)
+            os.replace(temporary, entry)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        self.evict()
+
+    def read_log(self, path):
+        """Returns the World parsed from the log at [path], parsing it only
+        if it is not cached yet"""
+        key = self.key(path)
+        world = self.get(path, key)
+        if world is None:
+            world = parser.World()
+            for _ in world.read_log(path):
+                pass
+            self.put(path, world, key)
+        return world
+
+    def read_log_from_file(self, filename):
+        """Like World.read_log_from_file, through the cache"""
+        return self.read_log(os.path.join(parser.World.log_directory, filename))
+
+    def entries(self):
+        """Returns (modification time, size, path) of each entry, oldest
+        first"""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            if name.startswith(".") or not name.endswith(entry_suffix):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        return entries
+
+    def size(self):
+        """Returns the total size in bytes of the entries"""
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """Removes the least recently used entries until the rest fit in
+        max_bytes, returning the number removed"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def invalidate(self, path):
+        """Removes the entry for the current content of the log at [path],
+        returning whether there was one"""
+        try:
+            os.unlink(self.entry(self.key(path)))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def clear(self):
+        """Removes every entry"""
+        for _, _, path in self.entries():
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
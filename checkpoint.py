@@ -0,0 +1,195 @@
+"""Checkpoints of parse state, to resume long log parses by byte offset.
+
+A checkpoint holds a binary snapshot of the World (see serializers) along
+with the identity of the log file and the byte offset just past the last
+line parsed into it.
+"""
+import io
+import json
+import os
+import tempfile
+import time
+import parser
+import readers
+import serializers
+
+# checkpoint files start with this, followed by the header length
+checkpoint_magic = b"TF2C"
+
+# default number of lines between checkpoints
+every_lines = 50000
+
+# default number of seconds between checkpoints
+every_seconds = 60.0
+
+class Checkpoint:
+    """A World and the position in its log file it was parsed up to"""
+    def __init__(self, world, source, offset=0, identity=None, lines=0):
+        self.world = world
+        self.source = source
+        self.offset = offset
+        self.identity = identity
+        self.lines = lines
+
+    def header(self):
+        return {
+            "source": self.source,
+            "offset": self.offset,
+            "identity": None if self.identity is None else list(self.identity),
+            "lines": self.lines,
+            "saved": time.time()
+        }
+
+    def save(self, path):
+        """Writes this checkpoint to [path] atomically.
+
+        The checkpoint is written to a temporary file in the same directory
+        and renamed over [path] once it is on disk, so [path] always holds
+        either the previous checkpoint or this one, never a partial file.
+        """
+        header = json.dumps(self.header()).encode()
+        snapshot = io.BytesIO()
+        serializers.dump_binary(self.world, snapshot)
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temporary = tempfile.mkstemp(
+            prefix=".{}.".format(os.path.basename(path)),
+            dir=directory
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(checkpoint_magic)
+                f.write(len(header).to_bytes(4, "little"))
+                f.write(header)
+                f.write(snapshot.getbuffer())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        try:
+            # make the rename itself durable
+            directory_fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(directory_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(directory_fd)
+
+    @classmethod
+    def load(cls, path):
+        """Reads the checkpoint at [path]"""
+        with open(path, "rb") as f:
+            if f.read(len(checkpoint_magic)) != checkpoint_magic:
+                raise ValueError("Not a checkpoint: {}".format(path))
+            length = int.from_bytes(f.read(4), "little")
+            header = json.loads(f.read(length).decode())
+            world = serializers.load_binary(f)
+        identity = header["identity"]
+        return cls(
+            world,
+            header["source"],
+            header["offset"],
+            None if identity is None else tuple(identity),
+            header["lines"]
+        )
+
+    def matches(self, source):
+        """Tests whether this checkpoint can be resumed on the file at
+        [source]: the same file, at least as long as the offset reached"""
+        try:
+            st = os.stat(source)
+        except FileNotFoundError:
+            return False
+        return (
+            os.path.abspath(source) == self.source
+            and readers.Follower.file_identity(st) == self.identity
+            and st.st_size >= self.offset
+        )
+
+def resume(source, path):
+    """Returns the Checkpoint at [path] if it can be resumed on the log at
+    [source], or a new Checkpoint with an empty World to start it from"""
+    source = os.path.abspath(source)
+    if os.path.exists(path):
+        checkpoint = Checkpoint.load(path)
+        if checkpoint.matches(source):
+            return checkpoint
+    return Checkpoint(parser.World(), source)
+
+def read_log(
+    source,
+    path,
+    every_lines=every_lines,
+    every_seconds=every_seconds,
+    binary=False,
+    follow=False,
+    interval=1.0
+):
+    """Parses the log file at [source], checkpointing to [path].
+
+    Parsing resumes from the checkpoint at [path] if it was taken on the
+    same file, and a new checkpoint is written every [every_lines] lines or
+    [every_seconds] seconds, whichever comes first, and when parsing ends
+    or the caller stops iterating.  Yields each matched Line, whose 'world'
+    is the resumed World.
+
+    With [binary], lines are matched as bytes.  With [follow], the file is
+    followed as it is written instead of ending at its end, see
+    readers.Follower.
+    """
+    checkpoint = resume(source, path)
+    world = checkpoint.world
+    follower = readers.Follower(
+        source,
+        offset=checkpoint.offset,
+        identity=checkpoint.identity,
+        interval=interval,
+        binary=True
+    )
+    lines = 0
+    saved = time.monotonic()
+
+    def save():
+        nonlocal lines, saved
+        checkpoint.offset = follower.offset
+        checkpoint.identity = follower.identity
+        checkpoint.lines += lines
+        checkpoint.save(path)
+        lines = 0
+        saved = time.monotonic()
+
+    def remaining():
+        # the log is taken to be complete, even without a final newline
+        yield from follower.poll()
+        if follower.partial:
+            line, follower.partial = follower.partial, b""
+            follower.offset += len(line)
+            yield line
+
+    with follower:
+        if follow:
+            raw_lines = iter(follower)
+        else:
+            raw_lines = remaining()
+        for line in raw_lines:
+            if not binary:
+                line = line.decode("utf-8", errors="replace")
+            result = parser.Line.identify(world, line)
+            lines += 1
+            if (
+                lines >= every_lines
+                or time.monotonic() - saved >= every_seconds
+            ):
+                save()
+            if result.matched:
+                try:
+                    yield result
+                except GeneratorExit:
+                    # the caller stopped, every line so far is in the World
+                    save()
+                    raise
+        save()
@@ -0,0 +1,421 @@
+"""A columnar store of parsed log events, for queries without re-parsing.
+
+Each Line subclass gets a directory of column files, one per attribute,
+appended to as lines are parsed.  Every column holds fixed size values:
+
+    time    int64 seconds from timeseries.unix_epoch
+    user    int32 index into the user table (by steam ID)
+    string  int32 index into the string dictionary
+    int     int64
+    float   float64
+
+Locations are split into three int columns (name.x, name.y, name.z) and
+the 'data' dict of a line into one column per key (data.damage, ...).  Rows
+missing a column hold its missing value: -1 for users and strings, the
+smallest int64 for times and ints, and NaN for floats.  Column files are
+little endian and can be memory mapped, see ColumnStore.
+"""
+import array
+import datetime
+import json
+import math
+import mmap
+import os
+import sys
+import tempfile
+import parser
+import timeseries
+
+# version of the store layout, see ColumnWriter
+store_version = 1
+
+# array typecode of each column kind
+typecodes = {
+    "time": "q",
+    "user": "i",
+    "string": "i",
+    "int": "q",
+    "float": "d"
+}
+
+# value of each column kind in rows without it
+missing = {
+    "time": -2 ** 63,
+    "user": -1,
+    "string": -1,
+    "int": -2 ** 63,
+    "float": math.nan
+}
+
+# Line attributes which are not event data
+skipped = ("world", "matched")
+
+# suffix of column file names
+column_suffix = ".col"
+
+def write_json(path, data):
+    """Writes [data] to [path] as JSON, replacing the file atomically"""
+    fd, temporary = tempfile.mkstemp(
+        prefix=".",
+        dir=os.path.dirname(os.path.abspath(path))
+    )
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+def little_endian(values):
+    if sys.byteorder != "little":
+        values = array.array(values.typecode, values)
+        values.byteswap()
+    return values
+
+class EventColumns:
+    """The columns of one event type while they are written"""
+    def __init__(self, directory, rows=0, columns=None):
+        self.directory = directory
+        # rows written to the column files
+        self.rows = rows
+        # column kinds by name
+        self.columns = dict(columns or {})
+        # rows not written yet, by column name
+        self.buffers = {
+            name: array.array(typecodes[kind])
+            for name, kind in self.columns.items()
+        }
+        self.pending = 0
+
+    def path(self, name):
+        return os.path.join(self.directory, name + column_suffix)
+
+    def add_column(self, name, kind):
+        """Adds a column, missing in every row so far"""
+        os.makedirs(self.directory, exist_ok=True)
+        fill = array.array(typecodes[kind], [missing[kind]])
+        with open(self.path(name), "wb") as f:
+            f.write(little_endian(fill * self.rows).tobytes())
+        self.columns[name] = kind
+        self.buffers[name] = fill * self.pending
+
+    def truncate(self):
+        """Cuts each column file back to the rows in the schema, dropping
+        rows flushed by a writer which stopped before updating it"""
+        for name, kind in self.columns.items():
+            size = self.rows * array.array(typecodes[kind]).itemsize
+            with open(self.path(name), "r+b") as f:
+                f.truncate(size)
+
+    def append(self, values):
+        """Adds a row of {name: (kind, value)}"""
+        row = {}
+        for name, (kind, value) in values.items():
+            known = self.columns.get(name)
+            if known is not None and known != kind:
+                # a value of another kind than before, keep it apart
+                name = "{}:{}".format(name, kind)
+                known = self.columns.get(name)
+            if known is None:
+                self.add_column(name, kind)
+            row[name] = value
+        for name, kind in self.columns.items():
+            self.buffers[name].append(row.get(name, missing[kind]))
+        self.pending += 1
+
+    def flush(self):
+        if not self.pending:
+            return
+        for name, values in self.buffers.items():
+            with open(self.path(name), "ab") as f:
+                f.write(little_endian(values).tobytes())
+            del values[:]
+        self.rows += self.pending
+        self.pending = 0
+
+class ColumnWriter:
+    """Writes parsed Lines to the columnar store in [directory].
+
+    An existing store is appended to, so one store can gather the events of
+    many logs.  Rows are written to the column files every [flush_rows]
+    rows and when the writer is flushed or closed; the schema, string
+    dictionary and user table are rewritten then.
+
+    Use sink() to store lines as they are parsed:
+
+    >>> with ColumnWriter("events") as writer:
+    ...     for line in writer.sink(world.read_log(path)):
+    ...         pass
+    """
+    def __init__(self, directory, flush_rows=65536):
+        self.directory = directory
+        self.flush_rows = flush_rows
+        self.pending = 0
+        os.makedirs(directory, exist_ok=True)
+        store = ColumnStore.read_tables(directory)
+        self.strings = {text: index for index, text in enumerate(store["strings"])}
+        self.users = store["users"]
+        self.user_ids = {
+            user["steam_id"]: index for index, user in enumerate(self.users)
+        }
+        self.events = {
+            event: EventColumns(
+                os.path.join(directory, event),
+                schema["rows"],
+                schema["columns"]
+            )
+            for event, schema in store["events"].items()
+        }
+        for columns in self.events.values():
+            columns.truncate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def string(self, text):
+        index = self.strings.get(text)
+        if index is None:
+            index = self.strings[text] = len(self.strings)
+        return index
+
+    def user(self, user):
+        if not user.valid:
+            return missing["user"]
+        index = self.user_ids.get(user.steam_id)
+        if index is None:
+            index = self.user_ids[user.steam_id] = len(self.users)
+            self.users.append({"steam_id": user.steam_id, "name": user.name})
+        else:
+            # the latest name seen
+            self.users[index]["name"] = user.name
+        return index
+
+    def encode(self, name, value, values):
+        """Adds the column values of attribute [name] to [values]"""
+        if value is None:
+            return
+        if isinstance(value, datetime.datetime):
+            values[name] = ("time", timeseries.to_seconds(value))
+        elif isinstance(value, parser.User):
+            values[name] = ("user", self.user(value))
+        elif isinstance(value, str):
+            values[name] = ("string", self.string(value))
+        elif isinstance(value, (bool, int)):
+            values[name] = ("int", int(value))
+        elif isinstance(value, float):
+            values[name] = ("float", value)
+        elif isinstance(value, parser.Location):
+            values[name + ".x"] = ("int", value.x)
+            values[name + ".y"] = ("int", value.y)
+            values[name + ".z"] = ("int", value.z)
+        elif isinstance(value, dict):
+            for key, item in value.items():
+                self.encode("{}.{}".format(name, key), item, values)
+        else:
+            values[name] = ("string", self.string(str(value)))
+
+    def write(self, line):
+        """Appends the matched Line [line] as a row of its event type"""
+        event = line.__class__.__name__
+        columns = self.events.get(event)
+        if columns is None:
+            columns = self.events[event] = EventColumns(
+                os.path.join(self.directory, event)
+            )
+        values = {}
+        for name, value in vars(line).items():
+            if name not in skipped:
+                self.encode(name, value, values)
+        columns.append(values)
+        self.pending += 1
+        if self.pending >= self.flush_rows:
+            self.flush()
+
+    def sink(self, lines):
+        """Writes each of [lines] as it passes through"""
+        for line in lines:
+            self.write(line)
+            yield line
+
+    def flush(self):
+        """Writes buffered rows and the tables describing them"""
+        for columns in self.events.values():
+            columns.flush()
+        self.pending = 0
+        write_json(os.path.join(self.directory, "strings.json"), list(self.strings))
+        write_json(os.path.join(self.directory, "users.json"), self.users)
+        # the schema last, it is what makes new rows visible to readers
+        write_json(os.path.join(self.directory, "schema.json"), {
+            "version": store_version,
+            "events": {
+                event: {"rows": columns.rows, "columns": columns.columns}
+                for event, columns in self.events.items()
+            }
+        })
+
+    def close(self):
+        self.flush()
+
+class ColumnStore:
+    """Reads the columnar store in [directory], see ColumnWriter.
+
+    Columns are memory mapped and returned as memoryviews of their values,
+    so scanning a column reads only that column's file.  For instance, the
+    airshots of one weapon:
+
+    >>> store = ColumnStore("events")
+    >>> rows = store.where("DamagePlayerTriggerLine", {
+    ...     "data.airshot": 1,
+    ...     "data.weapon": "tf_projectile_rocket"
+    ... })
+    >>> [store.value("DamagePlayerTriggerLine", "source", row) for row in rows]
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        tables = self.read_tables(directory)
+        self.strings = tables["strings"]
+        self.string_codes = {text: i for i, text in enumerate(self.strings)}
+        self.users = tables["users"]
+        self.user_ids = {
+            user["steam_id"]: i for i, user in enumerate(self.users)
+        }
+        self.schema = tables["events"]
+        self.maps = []
+        # column views by (event, name), each file is mapped once
+        self.views = {}
+
+    @staticmethod
+    def read_tables(directory):
+        """Returns the schema, strings and users of the store in
+        [directory], empty if there is none yet"""
+        tables = {"events": {}, "strings": [], "users": []}
+        try:
+            with open(os.path.join(directory, "schema.json")) as f:
+                schema = json.load(f)
+        except FileNotFoundError:
+            return tables
+        if schema["version"] != store_version:
+            raise ValueError("Unsupported store version {}".format(
+                schema["version"]
+            ))
+        tables["events"] = schema["events"]
+        for name in ("strings", "users"):
+            with open(os.path.join(directory, name + ".json")) as f:
+                tables[name] = json.load(f)
+        return tables
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        for view in self.views.values():
+            view.release()
+        self.views = {}
+        for mapped in self.maps:
+            try:
+                mapped.close()
+            except BufferError:
+                # a column view is still in use, leave it to the collector
+                pass
+        self.maps = []
+
+    def events(self):
+        return list(self.schema)
+
+    def rows(self, event):
+        return self.schema[event]["rows"]
+
+    def columns(self, event):
+        """Returns the column kinds of [event] by name"""
+        return dict(self.schema[event]["columns"])
+
+    def column(self, event, name):
+        """Returns the raw values of a column as a memoryview"""
+        view = self.views.get((event, name))
+        if view is None:
+            view = self.views[event, name] = self.map_column(event, name)
+        return view
+
+    def map_column(self, event, name):
+        kind = self.schema[event]["columns"][name]
+        typecode = typecodes[kind]
+        rows = self.schema[event]["rows"]
+        path = os.path.join(self.directory, event, name + column_suffix)
+        itemsize = array.array(typecode).itemsize
+        if rows == 0:
+            return memoryview(array.array(typecode))
+        if sys.byteorder != "little":
+            values = array.array(typecode)
+            with open(path, "rb") as f:
+                values.frombytes(f.read(rows * itemsize))
+            values.byteswap()
+            return memoryview(values)
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.maps.append(mapped)
+        # rows appended after the schema was read are not part of it
+        return memoryview(mapped)[:rows * itemsize].cast(typecode)
+
+    def decode(self, kind, value):
+        """Returns the value of a column entry, or None if missing"""
+        if kind == "float":
+            return None if math.isnan(value) else value
+        if value == missing[kind]:
+            return None
+        if kind == "time":
+            return timeseries.from_seconds(value)
+        if kind == "user":
+            return self.users[value]["steam_id"]
+        if kind == "string":
+            return self.strings[value]
+        return value
+
+    def value(self, event, name, row):
+        kind = self.schema[event]["columns"][name]
+        return self.decode(kind, self.column(event, name)[row])
+
+    def values(self, event, name):
+        """Yields the decoded values of a column"""
+        kind = self.schema[event]["columns"][name]
+        for value in self.column(event, name):
+            yield self.decode(kind, value)
+
+    def encode(self, kind, value):
+        """Returns the column entry for [value], or None if no row can hold
+        it (an unknown string or user)"""
+        if kind == "time":
+            return timeseries.to_seconds(value)
+        if kind == "user":
+            return self.user_ids.get(value)
+        if kind == "string":
+            return self.string_codes.get(value)
+        return value
+
+    def where(self, event, conditions):
+        """Returns the rows of [event] whose columns equal the values in
+        [conditions], {column name: value}.  Users are given by steam ID."""
+        rows = None
+        for name, value in conditions.items():
+            kind = self.schema[event]["columns"].get(name)
+            if kind is None:
+                return []
+            entry = self.encode(kind, value)
+            if entry is None:
+                return []
+            column = self.column(event, name)
+            if rows is None:
+                rows = [i for i, v in enumerate(column) if v == entry]
+            else:
+                rows = [i for i in rows if column[i] == entry]
+            if not rows:
+                return []
+        if rows is None:
+            return list(range(self.rows(event)))
+        return rows
@@ -1,10 +1,18 @@
 # -*- coding: UTF-8 -*-
+import array
 import collections
 import datetime
 import functools
+import operator
+import os
 import re
+import readers
 import timeseries
 
+# version of the parse results, bump whenever a change to this module
+# changes the World parsed from the same log (see cache.py)
+parser_version = 1
+
 patterns = {
     "user_re": '''"(?P<username>.*?)<(?P<server_id>\d+)>'''
                '''<(?P<steam_id>\[(?:[UIMGAPCgTcLa]:[0-4]:\d+)\]|BOT|Console)>'''
@@ -19,6 +27,13 @@ patterns = {
     "team_re": '''"(?P<team>.*?)"'''
 }
 patterns["data_re"] = '''(?P<data>(?:\s{item_re})*)\s*$'''.format(**patterns)
+patterns["prefix_re"] = '''L\s(?P<date>{date_re}):\s'''.format(**patterns)
+
+# aggregators of Counter series by the name they are serialized under
+aggregators = {
+    "add": operator.add,
+    "replace": timeseries.replace
+}
 
 class_icons = {
     "Sniper": "⌖",
@@ -34,8 +49,13 @@ class_icons = {
 
 class World:
     """Represents the game world"""
+    # directory searched by read_log_from_file
+    log_directory = "serverfiles/tf/logs"
+
     def __init__(self):
         self.known_users = {}
+        # maps raw user text to (User, name, team) for users seen before
+        self.user_cache = {}
         self.filename = ""
         self.mapname = ""
         self.team_names = {
@@ -54,31 +74,75 @@ class World:
         return "{}({})".format(self.__class__.__name__, attrs_str)
 
     def user_lookup(self, user_text):
-        user = User(user_text)
-        if not user.valid:
-            return user
-        if user.steam_id in self.known_users:
-            known_user = self.known_users[user.steam_id]
-            known_user.update(user)
+        """Returns the User for [user_text], registering new users.
+
+        Results are cached by the raw user text, so looking up a known
+        player neither runs the user regex nor builds a throwaway User.  The
+        cached name and team are re-applied on every hit, as the same user
+        may have been renamed or moved by a different user text since."""
+        cached = self.user_cache.get(user_text)
+        if cached is not None:
+            known_user, name, team = cached
+            if known_user.name != name or known_user.team != team:
+                known_user.update_identity(name, team)
             known_user.counters["seen"]["user_lookup"][self.timestamp] = 1
             return known_user
+        match = User.matcher.match(user_text)
+        if match is None:
+            return User.invalid()
+        name, steam_id, team = match.group("username", "steam_id", "team")
+        if steam_id in self.known_users:
+            known_user = self.known_users[steam_id]
+            known_user.update_identity(name, team)
+            known_user.counters["seen"]["user_lookup"][self.timestamp] = 1
         else:
-            self.known_users[user.steam_id] = user
-            return user
+            known_user = User(user_text, match=match)
+            self.known_users[steam_id] = known_user
+        self.user_cache[user_text] = (known_user, name, team)
+        return known_user
 
     def get_user_by_steam_id(self, steam_id):
         if steam_id in self.known_users:
             return self.known_users[steam_id]
-        return User(steam_id) # invalid
+        return User.invalid()
 
-    def read_log_from_file(self, filename):
-        with open('serverfiles/tf/logs/{}'.format(filename)) as f:
-            for line in f.readlines():
+    def read_log(self, source, binary=False):
+        """Parses [source] line by line, yielding each matched Line.
+
+        [source] may be a path, an open file object or an iterable of lines.
+        gzip, bz2, xz and zip compressed logs are decompressed on the fly.
+        Lines are read and parsed as they are consumed, so the log is never
+        held in memory as a whole.
+
+        With [binary], lines are matched as bytes (memory mapping plain log
+        files) and only the captured fields are decoded."""
+        for line in readers.iter_lines(source, binary=binary):
+            result = Line.identify(self, line)
+            if result.matched:
+                yield result
+            else:
+                pass # log here
+
+    def follow_log(self, source, **kwargs):
+        """Parses a log file as it is written, yielding each matched Line.
+
+        [source] is a path, with [kwargs] passed on to readers.Follower, or
+        a Follower to resume.  Only lines appended since the last one read
+        are parsed, updating this World's counters as they arrive.  This
+        never ends by itself; stop iterating to stop following."""
+        if isinstance(source, readers.Follower):
+            follower = source
+        else:
+            follower = readers.Follower(source, **kwargs)
+        with follower:
+            for line in follower:
                 result = Line.identify(self, line)
                 if result.matched:
                     yield result
-                else:
-                    pass # log here
+
+    def read_log_from_file(self, filename):
+        """Parses [filename] from World.log_directory"""
+        return self.read_log(os.path.join(self.log_directory, filename))
 
     def repr_json(self):
         return {
@@ -110,40 +174,94 @@ class Counter:
     Keys are generally User objects or strings.
 
     A 'totals' attribute is used to access timeseries data of totals for each
-    time increment in the child series.  All timeseries must have their start
-    and end times synchronized for defined behavior.
+    time increment in the child series.  Child series are aligned by interval,
+    so totals cover the union of their time ranges.
+
+    A Counter handed out by Counters for a name that was never written is
+    detached: it reads as empty and only adds itself to its owner once a
+    series is created in it.
     """
+    __slots__ = ("_values", "constructor", "_totals", "owner")
+
     class Totaller:
         """Implements the 'totals' attribute of a Counter instance
 
         Totallers use their .values() and .items() functions to yield the
         totals at each time yielded by their .keys().
+
+        Totals are computed in a single reduction over the child series,
+        padded into aligned typed arrays, and cached until one of the child
+        series changes.
         """
+        __slots__ = ("parent", "_cache_key", "_first", "_totals")
+
         def __init__(self, parent):
             self.parent = parent
+            self._cache_key = None
+            self._first = None
+            self._totals = None
+
+        def compute(self):
+            """Returns the first interval index and list of totals"""
+            series = self.parent._values.values()
+            # child versions only ever increase, so their sum changes on
+            # every write to any child
+            cache_key = (
+                id(self.parent._values),
+                len(self.parent._values),
+                sum(tseries._version for tseries in series)
+            )
+            if cache_key == self._cache_key:
+                return self._first, self._totals
+            spans = [ tseries for tseries in series if len(tseries) ]
+            if len({ (s.interval, s.epoch) for s in spans }) > 1:
+                # interval indices of such series mean different times
+                raise ValueError(
+                    "Cannot total series with different intervals or epochs"
+                )
+            if not spans:
+                first, totals = None, []
+            else:
+                first = min(tseries._first for tseries in spans)
+                last = max(tseries._last for tseries in spans)
+                floats = any(tseries.datatype is not int for tseries in spans)
+                typecode = "d" if floats else "q"
+                itemsize = array.array(typecode).itemsize
+                # pad each child to the full time period, then reduce all
+                # children at once
+                aligned = []
+                for tseries in spans:
+                    if hasattr(tseries, "value_array"):
+                        values = tseries.value_array()
+                    else:
+                        values = array.array(typecode, tseries.values())
+                    before = tseries._first - first
+                    after = last - tseries._last
+                    if before or after or values.typecode != typecode:
+                        values = (
+                            array.array(typecode, bytes(before * itemsize))
+                            + array.array(typecode, values)
+                            + array.array(typecode, bytes(after * itemsize))
+                        )
+                    aligned.append(values)
+                totals = list(map(sum, zip(*aligned)))
+            self._cache_key = cache_key
+            self._first = first
+            self._totals = totals
+            return first, totals
 
         def __iter__(self):
-            # Raises StopIteration if there are no entries
-            timestamps = next(
-                tseries.keys() for tseries in self.parent._values.values()
-            )
-            for ts in timestamps:
-                yield ts
+            first, totals = self.compute()
+            if first is None:
+                return
+            # all child series share an interval and epoch
+            bucket_time = next(iter(self.parent._values.values())).bucket_time
+            for bucket in range(first, first + len(totals)):
+                yield bucket_time(bucket)
 
         def values(self):
-            # self.parent._values.values() yields SparseTimeSeries objects.
-            # A list is made consisting of the values() generator for each of
-            # these SparseTimeSeries.  This list is expanded to the arguments
-            # for the zip() function.  Iterating over this zip() gives tuples
-            # of the child values, which are then summed and yielded as the
-            # .values() generator for the Totaller.
-            for value_list in zip(
-                *[
-                    tseries.values()
-                    for tseries in self.parent._values.values()
-                ]
-            ):
-                yield sum(value_list)
+            first, totals = self.compute()
+            return iter(totals)
 
         def keys(self):
             for ts in self:
@@ -153,17 +271,40 @@ class Counter:
             for ts, value in zip(self.keys(), self.values()):
                 yield ts, value
 
-    def __init__(self, *args, **kwargs):
+    def __init__(
+            self,
+            *args,
+            owner=None,
+            series_class=timeseries.SparseTimeSeries,
+            **kwargs
+        ):
         """Initialize the collection.
 
-        Arguments are passed on to each child SparseTimeSeries
+        Arguments are passed on to each child [series_class], by default
+        SparseTimeSeries.  [owner] is a (Counters, name) pair for detached
+        counters.
         """
         self._values = {}
-        self.constructor = functools.partial(
-            timeseries.SparseTimeSeries,
-            *args, **kwargs
-        )
-        self.totals = self.Totaller(self)
+        self.constructor = functools.partial(series_class, *args, **kwargs)
+        self._totals = None
+        self.owner = owner
+
+    @property
+    def totals(self):
+        if self._totals is None:
+            self._totals = self.Totaller(self)
+        return self._totals
+
+    def attach(self):
+        """Adds a detached counter to its owner.
+
+        If another counter was attached under the same name meanwhile, its
+        series are shared so writes through either are kept."""
+        counters, name = self.owner
+        self.owner = None
+        attached = counters.setdefault(name, self)
+        if attached is not self:
+            self._values = attached._values
 
     def repr_json(self):
         repr_values = []
@@ -171,28 +312,70 @@ class Counter:
             if isinstance(k, User):
                 k = '''"{}"'''.format(str(k))
             repr_values.append((k, v))
-        return {
-            "values": repr_values
+        keywords = self.constructor.keywords
+        result = {
+            "values": repr_values,
+            "series_class": self.constructor.func.__name__,
+            "interval": keywords.get("interval", 1)
         }
+        for name, aggregator in aggregators.items():
+            if keywords.get("aggregator") is aggregator:
+                result["aggregator"] = name
+        return result
 
     @classmethod
     def from_json(cls, data):
-        obj = cls()
-        obj._values = dict(data["values"])
+        """Restores a Counter, and how it builds new series.  Dumps from
+        before these were recorded take them from the first series."""
+        values = dict(data["values"])
+        first = next(iter(values.values()), None)
+        series_classes = {
+            c.__name__: c
+            for c in (timeseries.SparseTimeSeries, timeseries.ArrayTimeSeries)
+        }
+        if "series_class" in data:
+            series_class = series_classes[data["series_class"]]
+        elif first is not None:
+            series_class = first.__class__
+        else:
+            series_class = timeseries.SparseTimeSeries
+        kwargs = {}
+        if "interval" in data:
+            kwargs["interval"] = data["interval"]
+        elif first is not None:
+            kwargs["interval"] = first.interval
+        if first is not None and first.epoch != timeseries.unix_epoch:
+            kwargs["epoch"] = first.epoch
+        aggregator = aggregators.get(data.get("aggregator"))
+        if aggregator is not None:
+            kwargs["aggregator"] = aggregator
+            for series in values.values():
+                series.aggregator = aggregator
+        obj = cls(series_class=series_class, **kwargs)
+        obj._values = values
         return obj
 
     def reconstitute_user_keys(self, world):
+        """Replaces keys naming users, as written by repr_json, with the
+        Users of [world] holding the same steam ID.
+
+        Keys are resolved through world.known_users only, so no user text
+        is matched, nothing is recorded as seen and unknown users are left
+        as strings."""
+        known_users = world.known_users
         new_values = {}
         for key, value in self._values.items():
-            user = world.user_lookup(key)
-            if user.valid:
-                new_values[user] = value
-            else:
-                new_values[key] = value
+            if isinstance(key, str):
+                user = known_users.get(User.steam_id_from_text(key))
+                if user is not None:
+                    key = user
+            new_values[key] = value
         self._values = new_values
 
     def __getitem__(self, key):
         if not key in self._values:
+            if self.owner is not None:
+                self.attach()
             self._values[key] = self.constructor()
         return self._values[key]
 
@@ -222,6 +405,8 @@ class Counter:
 
 class Location:
     """Represents a location in x, y, z"""
+    __slots__ = ("x", "y", "z")
+
     def __init__(self, x=0, y=0, z=0):
         self.x = x
         self.y = y
@@ -238,6 +423,14 @@ class Location:
     def from_json(cls, data):
         return cls(**data)
 
+    @classmethod
+    def from_string(cls, text):
+        """Parses "x y z" integer coordinates, raising ValueError if invalid"""
+        coords = text.split()
+        if len(coords) != 3:
+            raise ValueError("Not a location: {!r}".format(text))
+        return cls(*[int(c) for c in coords])
+
     def __repr__(self):
         return "{}(x={}, y={}, z={})".format(
             self.__class__.__name__,
@@ -246,14 +439,109 @@ class Location:
             self.z
         )
 
+class Counters(dict):
+    """The named Counters of a User.
+
+    Counters are only created once something is written to them.  Reading a
+    name that has not been written gives an empty, detached Counter, which
+    is added here by its first write.  Iteration only covers counters that
+    have been written.
+
+    Child series are 'series_class', by default SparseTimeSeries, which
+    stores only the intervals written.  timeseries.ArrayTimeSeries reads and
+    totals faster but holds every interval between the first and last
+    write, so it only suits dense logs; set Counters.series_class to opt in.
+    """
+    __slots__ = ("interval",)
+    series_class = timeseries.SparseTimeSeries
+    names = (
+        "seen",
+        "kills",
+        "assists",
+        "constructions",
+        "destructions",
+        "damage",
+        "damage_by_weapon",
+        "realdamage",
+        "realdamage_by_weapon",
+        "damage_received",
+        "deaths",
+        "heals_given",
+        "heals_received",
+        "suicides",
+        "med_picks",
+        "points_captured",
+        "points_blocked",
+        "dominations",
+        "revenges",
+        "headshots",
+        "airshots",
+        "headshot_kills",
+        "backstab_kills",
+        "extinguishes",
+        "feigns",
+        "feigns_triggered"
+    )
+
+    def __init__(self, *args, interval=10, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.interval = interval
+
+    def __missing__(self, name):
+        if name not in self.names:
+            raise KeyError(name)
+        return self.new_counter(owner=(self, name))
+
+    @classmethod
+    def from_json(cls, data, interval):
+        """Builds the Counters of a User from its decoded JSON counters"""
+        counters = cls(interval=interval)
+        for name, counter in data.items():
+            counters[name] = counters.adopt(counter)
+        return counters
+
+    def new_counter(self, owner=None):
+        # child series add values on duplicate keys (aggregator function)
+        return Counter(
+            series_class=self.series_class,
+            aggregator=operator.add,
+            interval=self.interval,
+            owner=owner
+        )
+
+    def adopt(self, counter):
+        """Makes the loaded [counter] build and aggregate series as the
+        counters made here do, whatever the dump it came from recorded"""
+        counter.constructor = self.new_counter().constructor
+        for series in counter.values():
+            series.aggregator = operator.add
+        return counter
+
 class User:
     """Represents a User"""
+    __slots__ = (
+        "valid",
+        "name",
+        "steam_id",
+        "team",
+        "original_team",
+        "server_id",
+        "player_class",
+        "played_classes",
+        "interval",
+        "counters",
+        "positions"
+    )
     known_users = {}
-    def __init__(self, user_text, interval=10):
+    matcher = re.compile(patterns["user_re"])
+
+    def __init__(self, user_text, interval=10, match=None):
         """<user_text> is anything that will match user_re successfully.
         The 'valid' attribute indicates whether or not the constructor
-        was successful."""
-        match = re.match(patterns["user_re"], user_text)
+        was successful.  <match> may be passed if user_text has already
+        been matched against User.matcher."""
+        if match is None:
+            match = self.matcher.match(user_text)
         self.valid = match is not None
         if not self.valid:
             return
@@ -285,15 +573,71 @@ class User:
 
     @classmethod
     def from_json(cls, data):
-        user_text = '''"{name}<{server_id}><{steam_id}><{team}>"'''.format(**data)
-        obj = cls(user_text, data["interval"])
-        obj.original_team = data["original_team"]
-        obj.player_class = data["player_class"]
-        obj.played_classes = set(data["played_classes"])
-        obj.counters = data["counters"]
-        obj.positions = data["positions"]
+        positions = data["positions"]
+        # series only record their datatype through their values
+        positions.datatype = Location
+        return cls.from_fields(
+            data["name"],
+            data["steam_id"],
+            data["team"],
+            data["server_id"],
+            interval=data["interval"],
+            original_team=data["original_team"],
+            player_class=data["player_class"],
+            played_classes=data["played_classes"],
+            counters=Counters.from_json(data["counters"], data["interval"]),
+            positions=positions
+        )
+
+    @classmethod
+    def from_fields(
+        cls,
+        name,
+        steam_id,
+        team,
+        server_id,
+        interval=10,
+        original_team=None,
+        player_class=None,
+        played_classes=(),
+        counters=None,
+        positions=None
+    ):
+        """Builds a valid User directly from its fields.
+
+        Unlike the constructor, no user text is matched.  Unless given, the
+        User starts with empty counters and positions, as after
+        reset_counters()."""
+        obj = cls.__new__(cls)
+        obj.valid = True
+        obj.name = name
+        obj.steam_id = steam_id
+        obj.team = team
+        obj.original_team = team if original_team is None else original_team
+        obj.server_id = server_id
+        obj.player_class = player_class
+        obj.played_classes = set(played_classes)
+        obj.interval = interval
+        if counters is None or positions is None:
+            obj.reset_counters()
+        if counters is not None:
+            obj.counters = counters
+        if positions is not None:
+            obj.positions = positions
         return obj
 
+    @staticmethod
+    def steam_id_from_text(user_text):
+        """Returns the steam ID in [user_text] ("name<id><steam_id><team>",
+        quoted), or None.  Only the end of the text is split, as names
+        may contain anything."""
+        if not user_text.endswith('>"'):
+            return None
+        fields = user_text[:-2].rsplit("><", 2)
+        if len(fields) != 3:
+            return None
+        return fields[1]
+
     def reconstitute_user_keys(self, world):
         for counter in self.counters.values():
             counter.reconstitute_user_keys(world)
@@ -313,7 +657,9 @@ class User:
         return "{}({})".format(self.__class__.__name__, attrs_str)
 
     def __str__(self):
-        return "{name}<{server_id}><{steam_id}><{team}>".format(**self.__dict__)
+        return "{}<{}><{}><{}>".format(
+            self.name, self.server_id, self.steam_id, self.team
+        )
 
     def __format__(self, format_spec):
         player_symbol = class_icons.get(self.player_class, "?")
@@ -322,45 +668,10 @@ class User:
         ).__format__(format_spec)
 
     def team_class(self):
-        return "{original_team} {player_class}".format(**self.__dict__)
+        return "{} {}".format(self.original_team, self.player_class)
 
     def reset_counters(self):
-        # This creates a class constructor for defaultdict where the default
-        # value is an instance of SparseTimeSeries with the resolver kwarg set
-        # to add on duplicate key (aggregator function)
-        counter_builder = functools.partial(
-            Counter,
-            aggregator=lambda o, n: o+n,
-            interval=self.interval
-        )
-        self.counters = {
-            "seen": counter_builder(),
-            "kills": counter_builder(),
-            "assists": counter_builder(),
-            "constructions": counter_builder(),
-            "destructions": counter_builder(),
-            "damage": counter_builder(),
-            "damage_by_weapon": counter_builder(),
-            "realdamage": counter_builder(),
-            "realdamage_by_weapon": counter_builder(),
-            "damage_received": counter_builder(),
-            "deaths": counter_builder(),
-            "heals_given": counter_builder(),
-            "heals_received": counter_builder(),
-            "suicides": counter_builder(),
-            "med_picks": counter_builder(),
-            "points_captured": counter_builder(),
-            "points_blocked": counter_builder(),
-            "dominations": counter_builder(),
-            "revenges": counter_builder(),
-            "headshots": counter_builder(),
-            "airshots": counter_builder(),
-            "headshot_kills": counter_builder(),
-            "backstab_kills": counter_builder(),
-            "extinguishes": counter_builder(),
-            "feigns": counter_builder(),
-            "feigns_triggered": counter_builder()
-        }
+        self.counters = Counters(interval=self.interval)
         self.positions = timeseries.SparseTimeSeries(
             datatype=Location,
             interval=self.interval,
@@ -376,26 +687,111 @@ class User:
         self.positions.set_start(start)
         self.positions.set_end(end)
 
+    @classmethod
+    def invalid(cls):
+        """Returns an invalid User without matching any text"""
+        obj = cls.__new__(cls)
+        obj.valid = False
+        return obj
+
     def update(self, other):
-        self.name = other.name
+        self.update_identity(other.name, other.team)
+
+    def update_identity(self, name, team):
+        self.name = name
         if self.original_team not in ('Blue', 'Red'):
-            self.original_team = other.team
-        self.team = other.team
-        self.server_id = self.server_id
+            self.original_team = team
+        self.team = team
 
     def update_class(self, player_class):
         self.played_classes.add(player_class)
         self.player_class = player_class
 
+class DecodedMatch:
+    """Wraps a match of a bytes pattern, decoding captured groups on access.
+
+    Only the groups a Line actually reads are decoded, and invalid UTF-8 is
+    replaced rather than raising."""
+    def __init__(self, match):
+        self.match = match
+
+    def group(self, *args):
+        value = self.match.group(*args)
+        if isinstance(value, tuple):
+            return tuple(self.decode(v) for v in value)
+        return self.decode(value)
+
+    def groupdict(self):
+        return {
+            k: self.decode(v) for k, v in self.match.groupdict().items()
+        }
+
+    @staticmethod
+    def decode(value):
+        if value is None:
+            return None
+        return value.decode("utf-8", "replace")
+
+class Groups:
+    """Captured groups of a matched line, detached from the regex match.
+
+    Lets a line matched elsewhere (another process, an earlier time) be
+    parsed later through the same parse() methods."""
+    __slots__ = ("values",)
+
+    def __init__(self, values):
+        self.values = values
+
+    def group(self, name):
+        return self.values[name]
+
+    def groupdict(self):
+        return self.values
+
 class Line:
     """Represents a line in the log.  Base class.
-    Constructor requires a World instance and the text line."""
-    matcher = re.compile("$") # empty line for base class
+    Constructor requires a World instance and the text line.
 
-    def __init__(self, world, line):
-        result = self.matcher.match(line)
-        self.matched = result is not None
+    Lines with a "L <date>: " prefix set 'prefixed'.  Their matchers only
+    cover the remainder of the line, as the prefix and timestamp are parsed
+    once by Line.split_prefix before any matcher runs.
+
+    Subclasses that declare a 'keyword' are registered in Line.dispatch at
+    class definition time.  The keyword is a literal substring which every
+    line matched by the subclass contains, and is used by Line.identify to
+    select candidate subclasses without trying every matcher.
+
+    Lines may also be given as bytes, in which case the bytes_matcher
+    compiled from each matcher is used and captured groups are decoded only
+    when parsed."""
+    matcher = re.compile("$") # empty line for base class
+    bytes_matcher = re.compile(b"$")
+    prefix_matcher = re.compile(patterns["prefix_re"])
+    bytes_prefix_matcher = re.compile(patterns["prefix_re"].encode())
+    prefixed = False
+    keyword = None
+    dispatch = {}
+    keyword_matcher = None
+    bytes_keyword_matcher = None
+    # recently built timestamps by raw date text, see split_prefix
+    timestamps = {}
+    timestamps_size = 64
+
+    def __init__(self, world, line, timestamp=None, result=None):
+        """If [timestamp] is given, it was already parsed from the line
+        prefix and [line] is the remainder of the line.  Otherwise the
+        prefix is split off [line] here.  If [result] is given, the line
+        was already matched by this class (see Line.match) and [line] is
+        not used."""
         self.world = world
+        self.timestamp = timestamp
+        if result is None:
+            line = self.strip_newline(line)
+            if self.prefixed and timestamp is None:
+                self.timestamp, line = self.split_prefix(line)
+            if not self.prefixed or self.timestamp is not None:
+                result = self.match_remainder(line)
+        self.matched = result is not None
         if self.matched:
             self.parse(result)
             if hasattr(self, 'update_world'):
@@ -409,13 +805,78 @@ class Line:
         attrs_str = ", ".join(attr_reprs)
         return "{}({})".format(self.__class__.__name__, attrs_str)
 
-    def parse_timestamp(self, year, month, day, hour, minute, second, **kwargs):
-        """Parses a timestamp from kwargs.
+    def parse_timestamp(self, timestamp=None):
+        """Records the timestamp of this line on the world.
+           Defaults to the timestamp parsed from the line prefix."""
+        if timestamp is not None:
+            self.timestamp = timestamp
+        self.world.timestamp = self.timestamp
+
+    @staticmethod
+    def build_timestamp(year, month, day, hour, minute, second, **kwargs):
+        """Builds a datetime from kwargs.
            Meant to be passed with **values"""
-        self.timestamp = datetime.datetime(
+        return datetime.datetime(
             *( int(v) for v in (year, month, day, hour, minute, second) )
         )
-        self.world.timestamp = self.timestamp
+
+    @classmethod
+    def split_prefix(cls, line):
+        """Parses the "L <date>: " prefix of [line].
+
+        Returns a tuple of the timestamp and the remainder of the line, or
+        (None, line) if there is no prefix.
+
+        Many consecutive lines share the same second, so timestamps are
+        memoized by their raw date text and those lines get the very same
+        datetime object.  This also lets timeseries.to_seconds reuse its
+        last result."""
+        if isinstance(line, bytes):
+            prefix = cls.bytes_prefix_matcher.match(line)
+        else:
+            prefix = cls.prefix_matcher.match(line)
+        if prefix is None:
+            return None, line
+        date = prefix.group("date")
+        timestamp = Line.timestamps.get(date)
+        if timestamp is None:
+            if len(Line.timestamps) >= Line.timestamps_size:
+                Line.timestamps.clear()
+            timestamp = cls.build_timestamp(**prefix.groupdict())
+            Line.timestamps[date] = timestamp
+        return timestamp, line[prefix.end():]
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if "matcher" in cls.__dict__:
+            cls.bytes_matcher = re.compile(cls.matcher.pattern.encode())
+        # only register keywords declared on this class, not inherited ones
+        keyword = cls.__dict__.get("keyword")
+        if keyword is not None:
+            Line.dispatch.setdefault(keyword, []).append(cls)
+            Line.dispatch.setdefault(keyword.encode(), []).append(cls)
+            Line.keyword_matcher = None
+            Line.bytes_keyword_matcher = None
+
+    @classmethod
+    def build_keyword_matcher(cls):
+        """Compiles a single regex matching any registered keyword.
+
+        Longer keywords are tried first so that a keyword which is a prefix
+        of another never shadows it.  A bytes version is compiled alongside
+        for lines given as bytes."""
+        keywords = sorted(
+            (k for k in Line.dispatch if isinstance(k, str)),
+            key=len,
+            reverse=True
+        )
+        Line.keyword_matcher = re.compile(
+            "|".join(re.escape(keyword) for keyword in keywords)
+        )
+        Line.bytes_keyword_matcher = re.compile(
+            b"|".join(re.escape(keyword.encode()) for keyword in keywords)
+        )
+        return Line.keyword_matcher
 
     @classmethod
     def find_children(cls):
@@ -423,14 +884,68 @@ class Line:
         return cls.__subclasses__() + [g for s in cls.__subclasses__()
                                        for g in s.find_children()]
 
+    @staticmethod
+    def strip_newline(line):
+        """Removes the line ending from [line].
+
+        "$" only matches before a final LF, so a CR left by a CRLF line
+        ending (in bytes lines, or text decoded without universal newlines
+        as by readers.Follower) would make every such matcher fail."""
+        if isinstance(line, bytes):
+            return line.rstrip(b"\r\n")
+        return line.rstrip("\r\n")
+
+    @classmethod
+    def match_remainder(cls, line):
+        """Matches [line], without its prefix, against this class only"""
+        if isinstance(line, bytes):
+            result = cls.bytes_matcher.match(line)
+            if result is not None:
+                result = DecodedMatch(result)
+            return result
+        return cls.matcher.match(line)
+
     @classmethod
     def identify(cls, world, line):
         """Returns an instance of a subclass of Line that matches line, or Line that does not match"""
-        for subclass in set(cls.find_children()):
-            result = subclass(world, line)
-            if result.matched:
-                return result
-        return cls(world, line)
+        found = cls.match(line)
+        if found is None:
+            return cls(world, line)
+        subclass, timestamp, result = found
+        return subclass(world, line, timestamp, result)
+
+    @classmethod
+    def match(cls, line):
+        """Finds the subclass of cls that matches [line].
+
+        Returns a (subclass, timestamp, match) tuple, or None.  No World is
+        involved, so matching can happen apart from parsing; pass the tuple
+        items to the subclass constructor to parse the line."""
+        if Line.keyword_matcher is None:
+            cls.build_keyword_matcher()
+        if isinstance(line, bytes):
+            keyword_matcher = Line.bytes_keyword_matcher
+        else:
+            keyword_matcher = Line.keyword_matcher
+        line = cls.strip_newline(line)
+        timestamp, remainder = cls.split_prefix(line)
+        keyword = keyword_matcher.search(line)
+        while keyword is not None:
+            # a keyword may also turn up inside a player name or chat text,
+            # so keep scanning (overlapping) until a candidate matches
+            for subclass in Line.dispatch[keyword.group()]:
+                if not issubclass(subclass, cls):
+                    continue
+                if not subclass.prefixed:
+                    result = subclass.match_remainder(line)
+                elif timestamp is not None:
+                    result = subclass.match_remainder(remainder)
+                else:
+                    continue
+                if result is not None:
+                    return subclass, timestamp, result
+            keyword = keyword_matcher.search(line, keyword.start() + 1)
+        return None
 
     def parse(self, result):
         """Empty dictionary"""
@@ -439,36 +954,37 @@ class Line:
 
 class TimeLine(Line):
     """Lines that have a timestamp"""
+    prefixed = True
+
     def parse(self, result):
-        values = result.groupdict()
-        self.parse_timestamp(**values)
+        self.parse_timestamp()
 
 class TeamLine(TimeLine):
     """Lines that have a team attribute"""
     def parse(self, result):
         values = result.groupdict()
-        self.parse_timestamp(**values)
+        self.parse_timestamp()
         self.team = values["team"]
 
 class TextLine(TimeLine):
     """Lines that have a text attribute"""
     def parse(self, result):
         values = result.groupdict()
-        self.parse_timestamp(**values)
+        self.parse_timestamp()
         self.text = values["text"]
 
 class SourceLine(TimeLine):
     """Lines with a source"""
     def parse(self, result):
         values = result.groupdict()
-        self.parse_timestamp(**values)
+        self.parse_timestamp()
         self.source = self.world.user_lookup(values["source_user"])
 
 class SourceClassLine(SourceLine):
     """Lines with source and class"""
     def parse(self, result):
         values = result.groupdict()
-        self.parse_timestamp(**values)
+        self.parse_timestamp()
         self.source = self.world.user_lookup(values["source_user"])
         self.source.update_class(values["class"])
 
@@ -476,7 +992,7 @@ class SourceTeamLine(SourceLine, TeamLine):
     """Lines with source and team attributes"""
     def parse(self, result):
         values = result.groupdict()
-        self.parse_timestamp(**values)
+        self.parse_timestamp()
         self.source = self.world.user_lookup(values["source_user"])
         self.team = values["team"]
         self.source.team = self.team
@@ -485,7 +1001,7 @@ class SourceTextLine(SourceLine, TextLine):
     """Lines with source and text attributes"""
     def parse(self, result):
         values = result.groupdict()
-        self.parse_timestamp(**values)
+        self.parse_timestamp()
         self.source = self.world.user_lookup(values["source_user"])
         self.text = values["text"]
 
@@ -493,49 +1009,134 @@ class DataLine(TimeLine):
     """Lines that have a timestamp and "data" group"""
     def parse(self, result):
         values = result.groupdict()
-        self.parse_timestamp(**values)
+        self.parse_timestamp()
         self.data = self.parse_values(values["data"])
 
     def parse_values(self, values_string):
         data = dict(re.findall(patterns["item_re"], values_string))
         return self.coerce_data(data)
 
+    def coerce_number(self, value):
+        """Converts to int, or float, allowing a trailing 'f' ("0.5f")"""
+        try:
+            return int(value)
+        except ValueError:
+            pass
+        if value.endswith('f'):
+            value = value[:-1]
+        return float(value)
+
+    def coerce_user(self, value):
+        user = self.world.user_lookup('''"{}"'''.format(value))
+        if not user.valid:
+            raise ValueError("Not a user: {!r}".format(value))
+        return user
+
+    def coerce_location(self, value):
+        return Location.from_string(value)
+
+    def coerce_text(self, value):
+        return value
+
+    # converters for the keys found in log data, by method name.  A
+    # converter raising ValueError falls back to coerce_value.
+    coercers = {
+        "damage": "coerce_number",
+        "realdamage": "coerce_number",
+        "healing": "coerce_number",
+        "headshot": "coerce_number",
+        "airshot": "coerce_number",
+        "height": "coerce_number",
+        "ubercharge": "coerce_number",
+        "uberpct": "coerce_number",
+        "time": "coerce_number",
+        "duration": "coerce_number",
+        "seconds": "coerce_number",
+        "cp": "coerce_number",
+        "numcappers": "coerce_number",
+        "score": "coerce_number",
+        "player_count": "coerce_number",
+        "weapon": "coerce_text",
+        "crit": "coerce_text",
+        "customkill": "coerce_text",
+        "cpname": "coerce_text",
+        "object": "coerce_text",
+        "medigun": "coerce_text",
+        "winner": "coerce_text",
+        "reason": "coerce_text",
+        "file": "coerce_text",
+        "source": "coerce_text",
+        "command": "coerce_text",
+        "objectowner": "coerce_user",
+        "attacker_position": "coerce_location",
+        "victim_position": "coerce_location",
+        "assister_position": "coerce_location",
+        "position": "coerce_location"
+    }
+
+    @classmethod
+    def coercer_for(cls, key):
+        """Returns the converter name for [key], or None for coerce_value.
+
+        Numbered keys (player1, position1, ...) are resolved once and added
+        to the table.  Other keys are not, the table is shared by every
+        line and cvar names and arbitrary keys would grow it without bound."""
+        coercer = cls.coercers.get(key)
+        if coercer is not None:
+            return coercer
+        if key.startswith("player") and key[6:].isdigit():
+            coercer = "coerce_user"
+        elif key.startswith("position") and key[8:].isdigit():
+            coercer = "coerce_location"
+        else:
+            return None
+        DataLine.coercers[key] = coercer
+        return coercer
+
     def coerce_data(self, data):
-        """Attempt to convert strings to more useful types"""
+        """Attempt to convert strings to more useful types.
+
+        Known keys go straight to their converter from the coercers table,
+        other keys are tried against each type in turn."""
         coerced_data = {}
         for key, value in data.items():
             if type(value) is not str:
                 continue
-            try:
-                coerced_data[key] = int(value)
-                continue
-            except ValueError:
-                pass
-            try:
-                coerced_data[key] = float(value)
-                continue
-            except ValueError:
-                pass
-            try: # some floats have 'f' on the end, "0.5f"
-                if type(value) is str and value.endswith('f'):
-                    coerced_data[key] = float(value[:-1])
-                    continue
-            except ValueError:
-                pass
-            user = self.world.user_lookup('''"{}"'''.format(value))
-            if user.valid:
-                coerced_data[key] = user
-                continue
-            coords = value.split()
-            if len(coords) == 3:
+            coercer = self.coercer_for(key)
+            if coercer is not None:
                 try:
-                    coerced_data[key] = Location(*[int(c) for c in coords])
+                    coerced_data[key] = getattr(self, coercer)(value)
                     continue
                 except ValueError:
                     pass
+            coerced_data[key] = self.coerce_value(value)
         data.update(coerced_data)
         return data
 
+    def coerce_value(self, value):
+        """Attempt to convert a string of unknown type"""
+        try:
+            return int(value)
+        except ValueError:
+            pass
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try: # some floats have 'f' on the end, "0.5f"
+            if value.endswith('f'):
+                return float(value[:-1])
+        except ValueError:
+            pass
+        user = self.world.user_lookup('''"{}"'''.format(value))
+        if user.valid:
+            return user
+        try:
+            return Location.from_string(value)
+        except ValueError:
+            pass
+        return value
+
     def update_positions(self):
         position_regex = re.compile("position(\d+)")
         for key, value in self.data.items():
@@ -554,7 +1155,7 @@ class SourceDataLine(DataLine, SourceLine):
     """Lines with a source and data"""
     def parse(self, result):
         values = result.groupdict()
-        self.parse_timestamp(**values)
+        self.parse_timestamp()
         self.source = self.world.user_lookup(values["source_user"])
         self.data = self.parse_values(values["data"])
 
@@ -562,7 +1163,7 @@ class TeamDataLine(TeamLine, DataLine):
     """Lines with team and data attributes"""
     def parse(self, result):
         values = result.groupdict()
-        self.parse_timestamp(**values)
+        self.parse_timestamp()
         self.team = values["team"]
         self.data = self.parse_values(values["data"])
 
@@ -570,7 +1171,7 @@ class TextDataLine(TextLine, DataLine):
     """Lines with text and data attributes"""
     def parse(self, result):
         values = result.groupdict()
-        self.parse_timestamp(**values)
+        self.parse_timestamp()
         self.text = values["text"]
         self.data = self.parse_values(values["data"])
 
@@ -578,7 +1179,7 @@ class TeamTextDataLine(TextDataLine, TeamDataLine):
     """Lines with text, team, and data attributes"""
     def parse(self, result):
         values = result.groupdict()
-        self.parse_timestamp(**values)
+        self.parse_timestamp()
         self.text = values["text"]
         self.team = values["team"]
         self.data = self.parse_values(values["data"])
@@ -587,7 +1188,7 @@ class SourceWeaponDataLine(SourceDataLine):
     """Lines with source, weapon, and data"""
     def parse(self, result):
         values = result.groupdict()
-        self.parse_timestamp(**values)
+        self.parse_timestamp()
         self.source = self.world.user_lookup(values["source_user"])
         self.weapon = values["weapon"]
         self.data = self.parse_values(values["data"])
@@ -596,7 +1197,7 @@ class SourceTargetLine(SourceLine):
     """Lines with source and target"""
     def parse(self, result):
         values = result.groupdict()
-        self.parse_timestamp(**values)
+        self.parse_timestamp()
         self.source = self.world.user_lookup(values["source_user"])
         self.target = self.world.user_lookup(values["target_user"])
 
@@ -604,7 +1205,7 @@ class SourceTargetDataLine(SourceTargetLine, SourceDataLine):
     """Lines with sources, targets, and data"""
     def parse(self, result):
         values = result.groupdict()
-        self.parse_timestamp(**values)
+        self.parse_timestamp()
         self.source = self.world.user_lookup(values["source_user"])
         self.target = self.world.user_lookup(values["target_user"])
         self.data = self.parse_values(values["data"])
@@ -613,7 +1214,7 @@ class SourceTargetWeaponDataLine(SourceTargetDataLine):
     """Like SourceTargetDataLine but also has a weapon attribute"""
     def parse(self, result):
         values = result.groupdict()
-        self.parse_timestamp(**values)
+        self.parse_timestamp()
         self.source = self.world.user_lookup(values["source_user"])
         self.target = self.world.user_lookup(values["target_user"])
         self.weapon = values["weapon"]
@@ -621,8 +1222,9 @@ class SourceTargetWeaponDataLine(SourceTargetDataLine):
 
 class LogStartLine(DataLine):
     """Matches start of log"""
+    keyword = "Log file started"
     matcher = re.compile(
-        '''L\s{date_re}:\sLog file started{data_re}'''.format(
+        '''Log file started{data_re}'''.format(
             **patterns
         )
     )
@@ -631,58 +1233,65 @@ class LogStartLine(DataLine):
 
 class LogEndLine(TimeLine):
     """Matches end of log"""
+    keyword = "Log file closed."
     matcher = re.compile(
-        '''L\s{date_re}:\sLog file closed.$'''.format(**patterns)
+        '''Log file closed.$'''.format(**patterns)
     )
 
 class ServerMessageLine(TextLine):
     """Matches server messages"""
+    keyword = "server_message: "
     matcher = re.compile(
-        '''L\s{date_re}:\sserver_message: {text_re}$'''.format(**patterns)
+        '''server_message: {text_re}$'''.format(**patterns)
     )
 
 class ServerCvarLine(DataLine):
     """Matches server cvar states"""
+    keyword = '" = "'
     matcher = re.compile(
-        '''L\s{date_re}:\s"(?P<key>.*?)" = "(?P<value>.*?)"$'''.format(**patterns)
+        '''"(?P<key>.*?)" = "(?P<value>.*?)"$'''.format(**patterns)
     )
 
     def parse(self, result):
         values = result.groupdict()
-        self.parse_timestamp(**values)
+        self.parse_timestamp()
         self.data = self.coerce_data({ values["key"]: values["value"] })
 
 class ServerCvarSetLine(ServerCvarLine):
     """Matches server cvar changes"""
+    keyword = "server_cvar: "
     matcher = re.compile(
-        '''L\s{date_re}:\sserver_cvar: "(?P<key>.*?)" "(?P<value>.*?)"$'''.format(**patterns)
+        '''server_cvar: "(?P<key>.*?)" "(?P<value>.*?)"$'''.format(**patterns)
     )
 
 class LoadMapLine(TextLine):
     """Matches loading map lines"""
+    keyword = "Loading map "
     matcher = re.compile(
-        '''L\s{date_re}:\sLoading map {text_re}$'''.format(**patterns)
+        '''Loading map {text_re}$'''.format(**patterns)
     )
     def update_world(self):
         self.world.mapname = self.text
 
 class StartMapLine(TextDataLine):
     """Matches map start lines"""
+    keyword = "Started map "
     matcher = re.compile(
-        '''L\s{date_re}:\sStarted map {text_re}{data_re}'''.format(**patterns)
+        '''Started map {text_re}{data_re}'''.format(**patterns)
     )
     def update_world(self):
         self.world.mapname = self.text
 
 class RconLine(DataLine):
     """Matches an rcon command"""
+    keyword = "rcon from "
     matcher = re.compile(
-        '''L\s{date_re}:\srcon from "(?P<source>.*?)": command "(?P<command>.*?)"$'''.format(**patterns)
+        '''rcon from "(?P<source>.*?)": command "(?P<command>.*?)"$'''.format(**patterns)
     )
 
     def parse(self, result):
         values = result.groupdict()
-        self.parse_timestamp(**values)
+        self.parse_timestamp()
         self.data = self.coerce_data({
             "source": values["source"],
             "command": values["command"]
@@ -690,8 +1299,9 @@ class RconLine(DataLine):
 
 class TournamentModeLine(TimeLine):
     """Matches the beginning of tournament mode"""
+    keyword = "Tournament mode started"
     matcher = re.compile(
-        '''L\s{date_re}:\sTournament mode started$'''.format(**patterns)
+        '''Tournament mode started$'''.format(**patterns)
     )
     def update_world(self):
         for user in self.world.known_users.values():
@@ -700,6 +1310,7 @@ class TournamentModeLine(TimeLine):
 
 class TeamNameLine(Line):
     """Matches team name in tournament mode"""
+    keyword = " Team: "
     matcher = re.compile('''(?P<team>Red|Blue) Team: (?P<name>.*)$''')
 
     def parse(self, result):
@@ -713,16 +1324,18 @@ class TeamNameLine(Line):
 
 class SayLine(SourceTextLine):
     """Matches say lines"""
+    keyword = " say "
     matcher = re.compile(
-        '''L\s{date_re}:\s{source_re}\ssay\s{text_re}$'''.format(
+        '''{source_re}\ssay\s{text_re}$'''.format(
             **patterns
         )
     )
 
 class SayTeamLine(SayLine):
     """Matches say_team lines"""
+    keyword = " say_team "
     matcher = re.compile(
-        '''L\s{date_re}:\s{source_re}\ssay_team\s{text_re}$'''.format(
+        '''{source_re}\ssay_team\s{text_re}$'''.format(
             **patterns
         )
     )
@@ -733,50 +1346,57 @@ class SayTeamLine(SayLine):
 
 class PlayerConnectedLine(SourceTextLine):
     """Matches a player connecting to the server"""
+    keyword = " connected, address "
     matcher = re.compile(
-        '''L\s{date_re}:\s{source_re}\sconnected, address {text_re}$'''.format(
+        '''{source_re}\sconnected, address {text_re}$'''.format(
             **patterns
         )
     )
 
 class PlayerValidatedLine(SourceLine):
     """Matches a user getting validated"""
+    keyword = " STEAM USERID validated"
     matcher = re.compile(
-        '''L\s{date_re}:\s{source_re}\sSTEAM USERID validated$'''.format(
+        '''{source_re}\sSTEAM USERID validated$'''.format(
             **patterns
         )
     )
 
 class PlayerEnterGameLine(SourceLine):
     """Matches a player entering the game"""
+    keyword = " entered the game"
     matcher = re.compile(
-        '''L\s{date_re}:\s{source_re}\sentered the game$'''.format(
+        '''{source_re}\sentered the game$'''.format(
             **patterns
         )
     )
 
 class PlayerJoinTeamLine(SourceTeamLine):
     """Matches a player joining a team"""
+    keyword = " joined team "
     matcher = re.compile(
-        '''L\s{date_re}:\s{source_re}\sjoined team {team_re}$'''.format(**patterns)
+        '''{source_re}\sjoined team {team_re}$'''.format(**patterns)
     )
 
 class PlayerChangeClassLine(SourceClassLine):
     """Matches a player changing classes"""
+    keyword = " changed role to "
     matcher = re.compile(
-        '''L\s{date_re}:\s{source_re}\schanged role to "(?P<class>.*)"$'''.format(**patterns)
+        '''{source_re}\schanged role to "(?P<class>.*)"$'''.format(**patterns)
     )
 
 class PlayerChangeNameLine(SourceTextLine):
     """Matches a player name change event"""
+    keyword = " changed name to "
     matcher = re.compile(
-        '''L\s{date_re}:\s{source_re}\schanged name to {text_re}$'''.format(**patterns)
+        '''{source_re}\schanged name to {text_re}$'''.format(**patterns)
     )
 
 class DamagePlayerTriggerLine(SourceTargetDataLine):
     """Matches when damage is triggered on a player"""
+    keyword = ' triggered "damage" '
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\striggered "damage" '''
+        '''{source_re}\striggered "damage" '''
         '''against {target_re}{data_re}'''
     ).format(**patterns))
 
@@ -798,8 +1418,9 @@ class DamagePlayerTriggerLine(SourceTargetDataLine):
 
 class KillLine(SourceTargetWeaponDataLine):
     """Matches when a player kills another player"""
+    keyword = " killed "
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\skilled\s'''
+        '''{source_re}\skilled\s'''
         '''{target_re}\swith\s{weapon_re}'''
         '''{data_re}'''
     ).format(**patterns))
@@ -821,8 +1442,9 @@ class KillLine(SourceTargetWeaponDataLine):
 
 class KillAssistLine(SourceTargetDataLine):
     """Matches when a player gets a kill assist"""
+    keyword = ' triggered "kill assist" '
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\striggered "kill assist"'''
+        '''{source_re}\striggered "kill assist"'''
         ''' against {target_re}{data_re}'''
     ).format(**patterns))
 
@@ -831,14 +1453,15 @@ class KillAssistLine(SourceTargetDataLine):
 
 class SuicideLine(SourceWeaponDataLine):
     """Matches when a player suicides"""
+    keyword = " committed suicide with "
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\scommitted suicide with '''
+        '''{source_re}\scommitted suicide with '''
         '''{weapon_re}{data_re}'''
     ).format(**patterns))
 
     def parse(self, result):
         values = result.groupdict()
-        self.parse_timestamp(**values)
+        self.parse_timestamp()
         self.source = self.world.user_lookup(values["source_user"])
         self.weapon = values["weapon"]
         self.data = self.parse_values(values["data"])
@@ -848,8 +1471,9 @@ class SuicideLine(SourceWeaponDataLine):
 
 class WorldTriggerLine(TextDataLine):
     """Matches world triggers"""
+    keyword = "World triggered "
     matcher = re.compile((
-        '''L\s{date_re}:\sWorld triggered {text_re}'''
+        '''World triggered {text_re}'''
         '''{data_re}'''
     ).format(**patterns))
 
@@ -858,14 +1482,15 @@ class WorldTriggerLine(TextDataLine):
 
 class TeamStatusLine(TeamDataLine):
     """Matches team status lines"""
+    keyword = '" current score "'
     matcher = re.compile((
-        '''L\s{date_re}:\sTeam {team_re} current score "(?P<score>\d+)'''
+        '''Team {team_re} current score "(?P<score>\d+)'''
         '''" with "(?P<player_count>\d+)" players$'''
     ).format(**patterns))
 
     def parse(self, result):
         values = result.groupdict()
-        self.parse_timestamp(**values)
+        self.parse_timestamp()
         self.team = values["team"]
         self.data = self.coerce_data({
             "score": values["score"],
@@ -874,15 +1499,17 @@ class TeamStatusLine(TeamDataLine):
 
 class TeamFinalLine(TeamStatusLine):
     """Matches team final score lines"""
+    keyword = '" final score "'
     matcher = re.compile((
-        '''L\s{date_re}:\sTeam {team_re} final score "(?P<score>\d+)'''
+        '''Team {team_re} final score "(?P<score>\d+)'''
         '''" with "(?P<player_count>\d+)" players$'''
     ).format(**patterns))
 
 class CapturePointLine(TeamDataLine):
     """Matches team capture lines"""
+    keyword = ' triggered "pointcaptured"'
     matcher = re.compile((
-        '''L\s{date_re}:\sTeam {team_re} triggered "pointcaptured"'''
+        '''Team {team_re} triggered "pointcaptured"'''
         '''{data_re}'''
     ).format(**patterns))
 
@@ -894,14 +1521,15 @@ class CapturePointLine(TeamDataLine):
 
 class ItemPickUpLine(TeamTextDataLine):
     """Matches item pickups"""
+    keyword = " picked up item "
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\spicked up item '''
+        '''{source_re}\spicked up item '''
         '''{text_re}{data_re}'''
     ).format(**patterns))
 
     def parse(self, result):
         values = result.groupdict()
-        self.parse_timestamp(**values)
+        self.parse_timestamp()
         self.source = self.world.user_lookup(values["source_user"])
         self.text = values["text"]
         self.data = self.parse_values(values["data"])
@@ -912,8 +1540,9 @@ class ItemPickUpLine(TeamTextDataLine):
 
 class HealTriggerLine(SourceTargetDataLine):
     """Matches healing lines"""
+    keyword = ' triggered "healed" '
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\striggered "healed" '''
+        '''{source_re}\striggered "healed" '''
         '''against {target_re}{data_re}'''
     ).format(**patterns))
 
@@ -923,64 +1552,73 @@ class HealTriggerLine(SourceTargetDataLine):
 
 class ChargeReadyTriggerLine(SourceDataLine):
     """Matches uber deploy lines"""
+    keyword = ' triggered "chargeready"'
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\striggered '''
+        '''{source_re}\striggered '''
         '''"chargeready"{data_re}'''
     ).format(**patterns))
 
 class ChargeDeployTriggerLine(SourceDataLine):
     """Matches uber deploy lines"""
+    keyword = ' triggered "chargedeployed"'
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\striggered '''
+        '''{source_re}\striggered '''
         '''"chargedeployed"{data_re}'''
     ).format(**patterns))
 
 class ChargeEndedTriggerLine(SourceDataLine):
     """Matches uber deploy lines"""
+    keyword = ' triggered "chargeended"'
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\striggered '''
+        '''{source_re}\striggered '''
         '''"chargeended"{data_re}'''
     ).format(**patterns))
 
 class UberEmptyTriggerLine(SourceDataLine):
     """Matches uber empty lines"""
+    keyword = ' triggered "empty_uber"'
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\striggered '''
+        '''{source_re}\striggered '''
         '''"empty_uber"{data_re}'''
     ).format(**patterns))
 
 class UberAdvantageLostTriggerLine(SourceDataLine):
     """Matches when uber advantage is lost"""
+    keyword = ' triggered "lost_uber_advantage"'
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\striggered '''
+        '''{source_re}\striggered '''
         '''"lost_uber_advantage"{data_re}'''
     ).format(**patterns))
 
 class MedicDeathTrigger(SourceTargetDataLine):
     """Matches when medic deaths are recorded"""
+    keyword = ' triggered "medic_death" '
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\striggered '''
+        '''{source_re}\striggered '''
         '''"medic_death" against {target_re}{data_re}'''
     ).format(**patterns))
 
 class MedicDeathExTrigger(SourceDataLine):
     """Matches when medic deaths are recorded again?"""
+    keyword = ' triggered "medic_death_ex"'
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\striggered '''
+        '''{source_re}\striggered '''
         '''"medic_death_ex"{data_re}'''
     ).format(**patterns))
 
 class FirstHealAfterSpawnTrigger(SourceDataLine):
     """Matches when medic heals after spawning"""
+    keyword = ' triggered "first_heal_after_spawn"'
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\striggered '''
+        '''{source_re}\striggered '''
         '''"first_heal_after_spawn"{data_re}'''
     ).format(**patterns))
 
 class PlayerExtinguishedTriggerLine(SourceTargetWeaponDataLine):
     """Matches extinguish lines"""
+    keyword = ' triggered "player_extinguished" '
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\striggered '''
+        '''{source_re}\striggered '''
         '''"player_extinguished" against {target_re}'''
         ''' with {weapon_re}{data_re}'''
     ).format(**patterns))
@@ -990,24 +1628,27 @@ class PlayerExtinguishedTriggerLine(SourceTargetWeaponDataLine):
 
 class JarateAttackTriggerLine(SourceTargetWeaponDataLine):
     """Matches jarate_attack"""
+    keyword = ' triggered "jarate_attack" '
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\striggered '''
+        '''{source_re}\striggered '''
         '''"jarate_attack" against {target_re}'''
         ''' with {weapon_re}{data_re}'''
     ).format(**patterns))
 
 class MilkAttackTriggerLine(SourceTargetWeaponDataLine):
     """Matches milk_attack"""
+    keyword = ' triggered "milk_attack" '
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\striggered '''
+        '''{source_re}\striggered '''
         '''"milk_attack" against {target_re}'''
         ''' with {weapon_re}{data_re}'''
     ).format(**patterns))
 
 class KillObjectLine(SourceDataLine):
     """Matches 'killedobject' lines"""
+    keyword = ' triggered "killedobject"'
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\striggered '''
+        '''{source_re}\striggered '''
         '''"killedobject"{data_re}'''
     ).format(**patterns))
 
@@ -1016,15 +1657,17 @@ class KillObjectLine(SourceDataLine):
 
 class SpawnLine(SourceClassLine):
     """Matches 'spawned' lines"""
+    keyword = " spawned as "
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\sspawned as "'''
+        '''{source_re}\sspawned as "'''
         '''(?P<class>.*?)"$'''
     ).format(**patterns))
 
 class PlayerBuiltObjectTriggerLine(SourceDataLine):
     """Matches building lines"""
+    keyword = ' triggered "player_builtobject"'
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\striggered '''
+        '''{source_re}\striggered '''
         '''"player_builtobject"{data_re}'''
     ).format(**patterns))
 
@@ -1033,29 +1676,33 @@ class PlayerBuiltObjectTriggerLine(SourceDataLine):
 
 class PlayerCarryObjectTriggerLine(SourceDataLine):
     """Matches player carrying objects"""
+    keyword = ' triggered "player_carryobject"'
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\striggered '''
+        '''{source_re}\striggered '''
         '''"player_carryobject"{data_re}'''
     ).format(**patterns))
 
 class PlayerDropObjectTriggerLine(SourceDataLine):
     """Matches a player dropping an object"""
+    keyword = ' triggered "player_dropobject"'
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\striggered '''
+        '''{source_re}\striggered '''
         '''"player_dropobject"{data_re}'''
     ).format(**patterns))
 
 class ObjectDetonatedTriggerLine(SourceDataLine):
     """Matches a player detonating an object"""
+    keyword = ' triggered "object_detonated"'
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\striggered '''
+        '''{source_re}\striggered '''
         '''"object_detonated"{data_re}'''
     ).format(**patterns))
 
 class DominationTriggerLine(SourceTargetDataLine):
     """Matches domination lines"""
+    keyword = ' triggered "domination" '
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\striggered '''
+        '''{source_re}\striggered '''
         '''"domination" against {target_re}'''
         '''{data_re}'''
     ).format(**patterns))
@@ -1065,8 +1712,9 @@ class DominationTriggerLine(SourceTargetDataLine):
 
 class RevengeTriggerLine(SourceTargetDataLine):
     """Matches revenge lines"""
+    keyword = ' triggered "revenge" '
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\striggered '''
+        '''{source_re}\striggered '''
         '''"revenge" against {target_re}'''
         '''{data_re}'''
     ).format(**patterns))
@@ -1076,8 +1724,9 @@ class RevengeTriggerLine(SourceTargetDataLine):
 
 class CaptureBlockedTriggerLine(SourceDataLine):
     """Matches capture point blocked lines"""
+    keyword = ' triggered "captureblocked"'
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\striggered '''
+        '''{source_re}\striggered '''
         '''"captureblocked"{data_re}'''
     ).format(**patterns))
 
@@ -1086,7 +1735,8 @@ class CaptureBlockedTriggerLine(SourceDataLine):
 
 class PlayerDisconnectedLine(SourceDataLine):
     """Matches player disconnect lines"""
+    keyword = " disconnected"
     matcher = re.compile((
-        '''L\s{date_re}:\s{source_re}\sdisconnected'''
+        '''{source_re}\sdisconnected'''
         '''{data_re}'''
     ).format(**patterns))
@@ -0,0 +1,264 @@
+import bz2
+import gzip
+import io
+import lzma
+import mmap
+import os
+import time
+import zipfile
+
+# size in bytes of the read buffer used for log files
+buffer_size = 64 * 1024
+
+# leading bytes identifying each supported compression format
+signatures = (
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bz2"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"PK\x03\x04", "zip")
+)
+
+# stream decompressors, each reads its input in chunks as it is consumed
+decompressors = {
+    "gzip": gzip.open,
+    "bz2": bz2.open,
+    "xz": lzma.open
+}
+
+def is_path(source):
+    """Tests whether [source] names a file rather than holding its lines"""
+    return isinstance(source, (str, bytes, os.PathLike))
+
+def is_binary(source):
+    """Tests whether [source] is a file object opened in binary mode"""
+    return isinstance(source, (io.BufferedIOBase, io.RawIOBase))
+
+def detect_compression(f):
+    """Returns the compression format of binary file [f], or None.
+
+    The read position of [f] is left unchanged.  Streams which can neither
+    peek nor seek are assumed to be uncompressed."""
+    if hasattr(f, "peek"):
+        head = f.peek(6)[:6]
+    elif f.seekable():
+        position = f.tell()
+        head = f.read(6)
+        f.seek(position)
+    else:
+        return None
+    for signature, compression in signatures:
+        if head.startswith(signature):
+            return compression
+    return None
+
+def iter_members(f):
+    """Yields (name, binary file) for each log held in binary file [f].
+
+    Compressed files are decompressed as they are read.  Zip archives yield
+    one entry per member, each opened only when the previous one has been
+    consumed."""
+    name = getattr(f, "name", None)
+    compression = detect_compression(f)
+    if compression == "zip":
+        with zipfile.ZipFile(f) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                with archive.open(info) as member:
+                    # members may themselves be compressed logs
+                    for _, stream in iter_members(member):
+                        yield info.filename, stream
+    elif compression is not None:
+        with decompressors[compression](f) as stream:
+            yield name, stream
+    else:
+        yield name, f
+
+def iter_sources(source, buffer_size=buffer_size):
+    """Yields (name, binary file) for each log in a path or binary file"""
+    if is_path(source):
+        with open(source, "rb", buffering=buffer_size) as f:
+            yield from iter_members(f)
+    else:
+        yield from iter_members(source)
+
+def text_lines(f):
+    """Yields decoded lines from binary file [f] without closing it.
+
+    Log files are UTF-8, but player names are not guaranteed to be valid, so
+    undecodable bytes are replaced rather than failing the whole read."""
+    text = io.TextIOWrapper(f, encoding="utf-8", errors="replace")
+    try:
+        yield from text
+    finally:
+        # the caller owns the file, don't let the wrapper close it (unless
+        # the caller already did, when detaching would fail)
+        if not f.closed:
+            text.detach()
+
+def binary_lines(f):
+    """Yields undecoded lines from binary file [f].
+
+    Plain files on disk are memory mapped and read from the current
+    position, avoiding both decoding and copies through the read buffer.
+    Other streams (decompressors, archive members, pipes) are read line by
+    line."""
+    if not isinstance(f, (io.BufferedReader, io.FileIO)):
+        yield from f
+        return
+    try:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError, io.UnsupportedOperation):
+        # empty files cannot be mapped, nor can some special files
+        yield from f
+        return
+    with mapped:
+        mapped.seek(f.tell())
+        yield from iter(mapped.readline, b"")
+
+def iter_lines(source, buffer_size=buffer_size, binary=False):
+    """Yields the lines of [source] one at a time.
+
+    [source] may be a path, an open file object (text or binary) or any
+    iterable of lines.  Files are read through a buffer of [buffer_size]
+    bytes, so memory use does not depend on the size of the log.  Paths and
+    binary files compressed with gzip, bz2 or xz, and zip archives of logs,
+    are decompressed on the fly.
+
+    With [binary], lines read from files are yielded as undecoded bytes.
+    """
+    if is_path(source) or is_binary(source):
+        for name, f in iter_sources(source, buffer_size):
+            if binary:
+                yield from binary_lines(f)
+            else:
+                yield from text_lines(f)
+    else:
+        yield from source
+
+class Follower:
+    """Follows a log file as it is written to, like tail -F.
+
+    Iterating yields complete lines as they are appended, polling every
+    [interval] seconds once the end of the file is reached, and never ends.
+    'offset' is the byte offset just past the last line yielded, so a later
+    Follower given that [offset] (and the 'identity' of the file it was
+    read from) resumes where this one stopped.
+
+    A file replaced at [path] (log rotation) is read to its end before the
+    new one is opened from the start.  A file that shrinks (truncation) is
+    read again from the start.
+    """
+    def __init__(
+        self,
+        path,
+        offset=0,
+        identity=None,
+        interval=1.0,
+        binary=False,
+        buffer_size=buffer_size
+    ):
+        self.path = path
+        self.offset = offset
+        self.identity = identity
+        self.interval = interval
+        self.binary = binary
+        self.buffer_size = buffer_size
+        self.file = None
+        self.partial = b""
+
+    @staticmethod
+    def file_identity(st):
+        return (st.st_dev, st.st_ino)
+
+    def open(self):
+        """Opens the file at 'path', returning whether it exists"""
+        try:
+            f = open(self.path, "rb", buffering=0)
+        except FileNotFoundError:
+            return False
+        st = os.fstat(f.fileno())
+        identity = self.file_identity(st)
+        if self.identity is not None and identity != self.identity:
+            # not the file [offset] was taken in, so start it from the top
+            self.offset = 0
+        elif st.st_size < self.offset:
+            self.offset = 0
+        self.identity = identity
+        f.seek(self.offset)
+        self.file = f
+        self.partial = b""
+        return True
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def rotated(self):
+        """Tests whether 'path' now names a different file than the open one"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            # moved away, but its replacement isn't there yet
+            return False
+        return self.file_identity(st) != self.identity
+
+    def truncated(self):
+        return os.fstat(self.file.fileno()).st_size < self.offset + len(
+            self.partial
+        )
+
+    def drain(self):
+        """Yields the complete lines between 'offset' and the end of file"""
+        while True:
+            data = self.file.read(self.buffer_size)
+            if not data:
+                return
+            data = self.partial + data
+            end = data.rfind(b"\n") + 1
+            self.partial = data[end:]
+            if not end:
+                continue
+            lines = data[:end].splitlines(keepends=True)
+            # advance before yielding, a consumer may stop after any line
+            for line in lines:
+                self.offset += len(line)
+                yield line
+
+    def poll(self):
+        """Yields the lines written since the last poll, without waiting"""
+        if self.file is None and not self.open():
+            return
+        yield from self.drain()
+        if self.truncated():
+            self.file.seek(0)
+            self.offset = 0
+            self.partial = b""
+            yield from self.drain()
+        elif self.rotated():
+            # the old file is complete, even without a final newline
+            yield from self.drain()
+            if self.partial:
+                line, self.partial = self.partial, b""
+                self.offset += len(line)
+                yield line
+            self.close()
+            self.offset = 0
+            if self.open():
+                yield from self.drain()
+
+    def __iter__(self):
+        while True:
+            for line in self.poll():
+                if self.binary:
+                    yield line
+                else:
+                    yield line.decode("utf-8", errors="replace")
+            time.sleep(self.interval)
@@ -0,0 +1,375 @@
+"""Receives srcds log lines sent over UDP with logaddress_add.
+
+Each packet carries one log line.  Lines are parsed into one World per
+sending address, so several servers can log to the same receiver.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import socket
+import time
+import parser
+import reorder
+
+# every srcds log packet starts with this out of band header, followed by a
+# type byte: "R" for a plain line, "S" for a line preceded by sv_logsecret
+packet_header = b"\xff\xff\xff\xff"
+
+# default number of lines waiting to be parsed per source before dropping
+queue_size = 10000
+
+# default number of queued lines parsed together in one batch
+batch_size = 256
+
+# requested socket receive buffer in bytes, bursts beyond it are lost
+receive_buffer = 4 * 1024 * 1024
+
+# default number of sending addresses tracked at once
+max_sources = 256
+
+# default seconds without a packet after which a source may be forgotten
+source_timeout = 3600.0
+
+def packet_line(packet, secret=None):
+    """Returns the log line held in [packet] as bytes, or None if invalid.
+
+    Packets sent with sv_logsecret set are only accepted if [secret] (bytes)
+    matches; if [secret] is given, packets without one are rejected.
+    """
+    if not packet.startswith(packet_header):
+        return None
+    kind, body = packet[4:5], packet[5:]
+    if kind == b"S":
+        if secret is None or not body.startswith(secret):
+            return None
+        body = body[len(secret):]
+    elif kind != b"R" or secret is not None:
+        return None
+    return body.rstrip(b"\x00").rstrip(b"\r\n")
+
+def make_packet(line, secret=None):
+    """Builds a srcds log packet holding [line] (bytes)"""
+    if secret is None:
+        return packet_header + b"R" + line + b"\n\x00"
+    return packet_header + b"S" + secret + line + b"\n\x00"
+
+class Source:
+    """A server sending logs to a Receiver, with the World they build.
+
+    'received' counts lines queued, 'dropped' lines discarded because the
+    queue was full, 'parsed' lines that matched once parsed and 'errors'
+    lines that raised while parsing (a truncated line, for instance).
+
+    If [lateness] is given, lines are put back in timestamp order through a
+    reorder.ReorderBuffer before being applied to the World.
+    """
+    def __init__(self, address, queue_size=queue_size, lateness=None):
+        self.address = address
+        self.world = parser.World()
+        if lateness is None:
+            self.reorder = None
+        else:
+            self.reorder = reorder.ReorderBuffer(self.world, lateness)
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.received = 0
+        self.dropped = 0
+        self.parsed = 0
+        self.errors = 0
+        self.last_seen = None
+        self.task = None
+
+    def parse(self, lines):
+        """Parses [lines] into this source's World"""
+        world = self.world
+        parsed = 0
+        errors = 0
+        for line in lines:
+            # one bad line must not lose the rest of the batch
+            try:
+                if self.reorder is not None:
+                    parsed += len(self.reorder.push(line))
+                elif parser.Line.identify(world, line).matched:
+                    parsed += 1
+            except Exception:
+                errors += 1
+        self.parsed += parsed
+        self.errors += errors
+
+    def flush(self):
+        """Applies any lines still held for reordering"""
+        if self.reorder is not None:
+            self.parsed += len(self.reorder.flush())
+
+    def stats(self):
+        return {
+            "received": self.received,
+            "dropped": self.dropped,
+            "parsed": self.parsed,
+            "queued": self.queue.qsize(),
+            "errors": self.errors,
+            "late": 0 if self.reorder is None else self.reorder.dropped
+        }
+
+class Receiver(asyncio.DatagramProtocol):
+    """An asyncio datagram endpoint parsing srcds log packets.
+
+    Packets are only split and queued on the event loop.  Each source's
+    queue is drained in batches of up to [batch_size] lines, which are
+    parsed on a single worker thread if [threaded] (so Worlds are never
+    touched by two threads at once), otherwise on the event loop itself.
+    Lines arriving while a source already has [queue_size] waiting are
+    dropped and counted rather than stalling the loop.
+
+    UDP does not preserve order, so with [lateness] (seconds or a timedelta)
+    each source reorders its lines, see reorder.ReorderBuffer.
+
+    At most [max_sources] addresses are tracked.  When a new one arrives
+    with the table full, sources idle for [source_timeout] seconds are
+    forgotten, World and all; if none are, the new address's packets are
+    refused and counted in 'refused'.
+    """
+    def __init__(
+        self,
+        secret=None,
+        queue_size=queue_size,
+        batch_size=batch_size,
+        threaded=True,
+        lateness=None,
+        max_sources=max_sources,
+        source_timeout=source_timeout
+    ):
+        self.secret = secret
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.lateness = lateness
+        self.max_sources = max_sources
+        self.source_timeout = source_timeout
+        if threaded:
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        else:
+            self.executor = None
+        self.sources = {}
+        self.invalid = 0
+        self.refused = 0
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        line = packet_line(data, self.secret)
+        if line is None:
+            self.invalid += 1
+            return
+        source = self.sources.get(address)
+        if source is None:
+            if len(self.sources) >= self.max_sources:
+                self.expire()
+                if len(self.sources) >= self.max_sources:
+                    self.refused += 1
+                    return
+            source = self.sources[address] = Source(
+                address,
+                self.queue_size,
+                self.lateness
+            )
+            source.task = asyncio.ensure_future(self.consume(source))
+        source.last_seen = time.monotonic()
+        try:
+            source.queue.put_nowait(line)
+        except asyncio.QueueFull:
+            source.dropped += 1
+        else:
+            source.received += 1
+
+    def expire(self, timeout=None):
+        """Forgets the sources idle for [timeout] seconds (default
+        'source_timeout') with no lines waiting, returning them"""
+        if timeout is None:
+            timeout = self.source_timeout
+        now = time.monotonic()
+        expired = [
+            source for source in self.sources.values()
+            if now - source.last_seen >= timeout and source.queue.empty()
+        ]
+        for source in expired:
+            if source.task is not None:
+                source.task.cancel()
+            del self.sources[source.address]
+        return expired
+
+    async def consume(self, source):
+        """Parses the lines queued for [source] as they arrive"""
+        loop = asyncio.get_running_loop()
+        queue = source.queue
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                if self.executor is None:
+                    source.parse(batch)
+                else:
+                    await loop.run_in_executor(
+                        self.executor,
+                        source.parse,
+                        batch
+                    )
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def join(self, flush=False):
+        """Waits until every line received so far has been parsed.
+
+        With [flush], lines held for reordering are applied too."""
+        loop = asyncio.get_running_loop()
+        for source in list(self.sources.values()):
+            await source.queue.join()
+            if not flush:
+                continue
+            if self.executor is None:
+                source.flush()
+            else:
+                await loop.run_in_executor(self.executor, source.flush)
+
+    def close(self):
+        for source in self.sources.values():
+            if source.task is not None:
+                source.task.cancel()
+        if self.transport is not None:
+            self.transport.close()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def stats(self):
+        return {
+            "invalid": self.invalid,
+            "refused": self.refused,
+            "sources": {
+                "{}:{}".format(*address): source.stats()
+                for address, source in self.sources.items()
+            }
+        }
+
+async def listen(host, port, receive_buffer=receive_buffer, **kwargs):
+    """Starts a Receiver on [host]:[port], see Receiver for [kwargs]"""
+    loop = asyncio.get_running_loop()
+    transport, receiver = await loop.create_datagram_endpoint(
+        lambda: Receiver(**kwargs),
+        local_addr=(host, port)
+    )
+    # the kernel may cap this (net.core.rmem_max), which is fine
+    transport.get_extra_info("socket").setsockopt(
+        socket.SOL_SOCKET,
+        socket.SO_RCVBUF,
+        receive_buffer
+    )
+    return receiver
+
+async def replay(path, host, port, rate=None, secret=None):
+    """Sends the lines of the log at [path] to [host]:[port] as srcds does.
+
+    [rate] limits the lines sent per second, for testing a receiver locally.
+    """
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        asyncio.DatagramProtocol,
+        remote_addr=(host, port)
+    )
+    sent = 0
+    try:
+        with open(path, "rb") as f:
+            for line in f:
+                transport.sendto(make_packet(line.rstrip(b"\r\n"), secret))
+                sent += 1
+                if rate:
+                    await asyncio.sleep(1.0 / rate)
+                else:
+                    # let a receiver in the same loop keep up
+                    await asyncio.sleep(0)
+    finally:
+        transport.close()
+    return sent
+
+async def run_listener(args):
+    receiver = await listen(
+        args.host,
+        args.port,
+        secret=args.secret,
+        queue_size=args.queue_size,
+        batch_size=args.batch_size,
+        threaded=not args.inline,
+        lateness=args.lateness,
+        max_sources=args.max_sources
+    )
+    try:
+        while True:
+            await asyncio.sleep(args.report)
+            for address, source in receiver.sources.items():
+                print("{}:{} {} ({} users)".format(
+                    address[0],
+                    address[1],
+                    source.stats(),
+                    len(source.world.known_users)
+                ))
+            if receiver.invalid:
+                print("invalid packets: {}".format(receiver.invalid))
+            if receiver.refused:
+                print("refused packets: {}".format(receiver.refused))
+    finally:
+        receiver.close()
+
+def main(argv=None):
+    arguments = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = arguments.add_subparsers(dest="command")
+    commands.required = True
+    listener = commands.add_parser("listen", help="receive and parse logs")
+    listener.add_argument("--host", default="0.0.0.0")
+    listener.add_argument("--port", type=int, default=27500)
+    listener.add_argument("--queue-size", type=int, default=queue_size)
+    listener.add_argument("--batch-size", type=int, default=batch_size)
+    listener.add_argument("--max-sources", type=int, default=max_sources)
+    listener.add_argument(
+        "--inline",
+        action="store_true",
+        help="parse on the event loop rather than a worker thread"
+    )
+    listener.add_argument(
+        "--lateness",
+        type=float,
+        help="seconds to hold lines for reordering (default: no reordering)"
+    )
+    listener.add_argument(
+        "--report",
+        type=float,
+        default=10.0,
+        help="seconds between status reports"
+    )
+    sender = commands.add_parser("replay", help="send a log file as srcds")
+    sender.add_argument("path")
+    sender.add_argument("--host", default="127.0.0.1")
+    sender.add_argument("--port", type=int, default=27500)
+    sender.add_argument("--rate", type=float, help="lines per second")
+    for command in (listener, sender):
+        command.add_argument("--secret", help="sv_logsecret of the server")
+    args = arguments.parse_args(argv)
+    if args.secret is not None:
+        args.secret = args.secret.encode()
+    if args.command == "listen":
+        try:
+            asyncio.run(run_listener(args))
+        except KeyboardInterrupt:
+            pass
+    else:
+        sent = asyncio.run(replay(
+            args.path,
+            args.host,
+            args.port,
+            rate=args.rate,
+            secret=args.secret
+        ))
+        print("sent {} lines".format(sent))
+
+if __name__ == "__main__":
+    main()
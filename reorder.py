@@ -0,0 +1,101 @@
+import datetime
+import heapq
+import itertools
+import parser
+import readers
+
+# default time an event may arrive after later ones and still be reordered
+lateness = datetime.timedelta(seconds=2)
+
+# default number of events held before the oldest are released regardless
+capacity = 10000
+
+class ReorderBuffer:
+    """Releases log lines to a World in timestamp order.
+
+    Lines are matched as they are pushed (see Line.match) but only applied
+    to the World once no earlier line can still be accepted: when the newest
+    timestamp seen is more than [lateness] past theirs.  Lines arriving
+    after a later line was released are dropped and counted in 'dropped'.
+    Lines with the same timestamp keep their arrival order, and lines
+    without a timestamp (team names) are placed at the newest one seen.
+
+    At most [capacity] lines are held, older ones being released early if
+    needed, so memory use is bounded whatever the input.
+    """
+    def __init__(self, world, lateness=lateness, capacity=capacity):
+        if not isinstance(lateness, datetime.timedelta):
+            lateness = datetime.timedelta(seconds=lateness)
+        self.world = world
+        self.lateness = lateness
+        self.capacity = capacity
+        self.heap = []
+        self.sequence = itertools.count()
+        self.newest = None
+        self.released = None
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, line):
+        """Accepts the raw [line] (str or bytes), returning the list of
+        matched Lines it allows to be released"""
+        found = parser.Line.match(line)
+        if found is None:
+            return []
+        subclass, timestamp, result = found
+        order = timestamp
+        if order is None:
+            order = self.newest or self.released
+        if order is not None:
+            if self.released is not None and order < self.released:
+                self.dropped += 1
+                return []
+            if self.newest is None or order > self.newest:
+                self.newest = order
+        else:
+            # nothing timestamped yet, release it first
+            order = datetime.datetime.min
+        heapq.heappush(
+            self.heap,
+            (order, next(self.sequence), subclass, timestamp, line, result)
+        )
+        released = []
+        if self.newest is not None:
+            released = self.release(self.newest - self.lateness)
+        while len(self.heap) > self.capacity:
+            released.append(self.pop())
+        return released
+
+    def pop(self):
+        order, _, subclass, timestamp, line, result = heapq.heappop(self.heap)
+        self.released = order
+        return subclass(self.world, line, timestamp, result)
+
+    def release(self, until):
+        """Returns the list of held Lines timestamped no later than [until],
+        applying them to the World"""
+        heap = self.heap
+        released = []
+        while heap and heap[0][0] <= until:
+            released.append(self.pop())
+        return released
+
+    def flush(self):
+        """Returns the list of every held Line, as at the end of input"""
+        released = []
+        while self.heap:
+            released.append(self.pop())
+        return released
+
+    def feed(self, lines):
+        """Pushes each of [lines], then flushes, yielding the Lines released"""
+        for line in lines:
+            yield from self.push(line)
+        yield from self.flush()
+
+def read_reordered(world, source, **kwargs):
+    """Parses [source] into [world] through a ReorderBuffer, see
+    World.read_log for [source] and ReorderBuffer for [kwargs]"""
+    return ReorderBuffer(world, **kwargs).feed(readers.iter_lines(source))
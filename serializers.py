@@ -1,14 +1,25 @@
+import array
 import datetime
+import io
+import itertools
 import json
+import operator
+import sys
 import parser
 import timeseries
 
 def datetime_repr_json(dt):
+    # wall clock milliseconds, independent of the host timezone.  Dumps
+    # written before this used "timestamp", in the writing host's local time
+    seconds = timeseries.to_seconds(dt) + dt.microsecond / 1000000
     return {
-        "timestamp": dt.timestamp() * 1000
+        "wallclock": seconds * 1000
     }
 
 def datetime_from_json(data):
+    if "wallclock" in data:
+        return timeseries.from_seconds(data["wallclock"] / 1000)
+    # an older dump, only readable in the timezone it was written in
     return datetime.datetime.fromtimestamp(data["timestamp"] / 1000)
 
 class Encoder(json.JSONEncoder):
@@ -41,6 +52,7 @@ class Decoder(json.JSONDecoder):
         self.known_classes = {
             "datetime": datetime.datetime,
             "SparseTimeSeries": timeseries.SparseTimeSeries,
+            "ArrayTimeSeries": timeseries.ArrayTimeSeries,
             "World": parser.World,
             "Counter": parser.Counter,
             "Location": parser.Location,
@@ -61,3 +73,898 @@ class Decoder(json.JSONDecoder):
             result = _class.from_json(d)
         self.decoded[_id] = result
         return result
+
+class StreamEncoder:
+    """Writes JSON in the format of Encoder to a text file as it goes.
+
+    World, User and Counter objects, and the dicts and lists holding them,
+    are written piece by piece, so the whole document is never built in
+    memory.  Everything else (series, locations, datetimes and plain values)
+    is written by an Encoder, one top level value at a time.  Backrefs are
+    only tracked within each of those values, so memory use is bounded by
+    the largest series rather than by the whole World.
+    """
+    streamed = (parser.World, parser.User, parser.Counter)
+
+    def __init__(self, f):
+        self.f = f
+
+    def encode(self, o):
+        write = self.f.write
+        if isinstance(o, self.streamed):
+            write('{{"__class__": {}, "__id__": {}'.format(
+                json.dumps(o.__class__.__name__),
+                id(o)
+            ))
+            for key, value in o.repr_json().items():
+                write(", {}: ".format(self.key(key)))
+                self.encode(value)
+            write("}")
+        elif isinstance(o, dict):
+            write("{")
+            for index, (key, value) in enumerate(o.items()):
+                if index:
+                    write(", ")
+                write("{}: ".format(self.key(key)))
+                self.encode(value)
+            write("}")
+        elif isinstance(o, (list, tuple)):
+            write("[")
+            for index, value in enumerate(o):
+                if index:
+                    write(", ")
+                self.encode(value)
+            write("]")
+        elif o is None or isinstance(o, (str, int, float)):
+            write(json.dumps(o))
+        else:
+            write(Encoder().encode(o))
+
+    @staticmethod
+    def key(key):
+        # as json does, keys that aren't strings are written as strings
+        if not isinstance(key, str):
+            key = json.dumps(key)
+        return json.dumps(key)
+
+# identifies JSON Worlds written with shared tables, see NormalizedEncoder
+normalized_format = "tf2logs-normalized"
+normalized_version = 1
+
+class NormalizedEncoder:
+    """Writes a World as JSON with shared tables, as it goes.
+
+    Every counter title and string key (weapons, objects, control points)
+    is written once in a string table, and every user once in a user table,
+    and counters refer to both by index.  Series are written as the offsets
+    between their stored intervals, counted from a timestamp base shared by
+    the whole World, and their values.  The size of the document so grows
+    with the number of events rather than with events times key length.
+
+    The user table comes first, so that a user's counters can be decoded
+    as soon as they are read; see StreamDecoder.
+    """
+    def __init__(self, f):
+        self.f = f
+        self.strings = {}
+        self.users = {}
+        self.base = 0
+
+    def string(self, text):
+        index = self.strings.get(text)
+        if index is None:
+            index = self.strings[text] = len(self.strings)
+        return index
+
+    def tables(self, world):
+        """Fills the tables and timestamp base from a first pass over
+        [world], which only looks at keys and series bounds"""
+        starts = []
+        for user in world.known_users.values():
+            self.users[id(user)] = len(self.users)
+        for user in world.known_users.values():
+            for title, counter in user.counters.items():
+                self.string(title)
+                for key, series in counter._values.items():
+                    key = self.key(key)
+                    if isinstance(key, str):
+                        self.string(key)
+                    if series._first is not None:
+                        starts.append(self.start(series))
+            if user.positions._first is not None:
+                starts.append(self.start(user.positions))
+        if starts:
+            self.base = min(starts)
+
+    @staticmethod
+    def start(series):
+        """Returns the seconds from unix_epoch to the start of [series]"""
+        return series._epoch_seconds + series._first * series.interval
+
+    def key(self, key):
+        """Returns the user table index of a User [key], or a string"""
+        if isinstance(key, parser.User):
+            index = self.users.get(id(key))
+            if index is not None:
+                return index
+            # not one of this world's users, keep it by name as the JSON
+            # encoder does
+            return '''"{}"'''.format(str(key))
+        if not isinstance(key, str):
+            raise TypeError("Cannot write counter key {!r}".format(key))
+        return key
+
+    def time(self, dt):
+        if dt is None:
+            return None
+        seconds = timeseries.to_seconds(dt) - self.base
+        if dt.microsecond:
+            seconds += dt.microsecond / 1000000
+        return seconds
+
+    def user_fields(self, user):
+        return {
+            "name": user.name,
+            "steam_id": user.steam_id,
+            "team": user.team,
+            "original_team": user.original_team,
+            "server_id": user.server_id,
+            "player_class": user.player_class,
+            "played_classes": list(user.played_classes),
+            "interval": user.interval
+        }
+
+    def user_data(self, user):
+        counters = []
+        for title, counter in user.counters.items():
+            by_user = []
+            by_string = []
+            for key, series in counter._values.items():
+                key = self.key(key)
+                if isinstance(key, str):
+                    by_string.append([self.strings[key], self.series(series)])
+                else:
+                    by_user.append([key, self.series(series)])
+            counters.append([self.strings[title], by_user, by_string])
+        return {
+            "counters": counters,
+            "positions": self.series(user.positions)
+        }
+
+    def series(self, series):
+        if series.__class__ is timeseries.ArrayTimeSeries:
+            if series._origin is None:
+                buckets, values = [], []
+            else:
+                present = series._present
+                data = series._data
+                indices = [i for i in range(len(present)) if present[i]]
+                buckets = [series._origin + i for i in indices]
+                values = [data[i] for i in indices]
+        else:
+            buckets = series._keys
+            values = [series._values[bucket] for bucket in buckets]
+        if series.datatype is parser.Location:
+            values = [[v.x, v.y, v.z] for v in values]
+        shift = (self.base - series._epoch_seconds) // series.interval
+        result = {
+            "class": series.__class__.__name__,
+            "datatype": series.datatype.__name__,
+            "interval": series.interval,
+            "keep_last_value": series.keep_last_value,
+            "first": None if series._first is None else series._first - shift,
+            "last": None if series._last is None else series._last - shift,
+            "start": buckets[0] - shift if buckets else 0,
+            "offsets": [b - a for a, b in zip(buckets, buckets[1:])],
+            "values": values
+        }
+        if series.epoch != timeseries.unix_epoch:
+            offset = series.epoch.utcoffset()
+            result["epoch"] = [
+                series._epoch_seconds,
+                None if offset is None else offset.days * 86400 + offset.seconds
+            ]
+        return result
+
+    def encode(self, world):
+        write = self.f.write
+        users = list(world.known_users.values())
+        self.tables(world)
+        write('{{"format": {}, "version": {}, "base": {}, "strings": {}'.format(
+            json.dumps(normalized_format),
+            normalized_version,
+            self.base,
+            json.dumps(list(self.strings))
+        ))
+        write(', "users": {}'.format(
+            json.dumps([self.user_fields(user) for user in users])
+        ))
+        write(', "world": {}'.format(json.dumps({
+            "filename": world.filename,
+            "mapname": world.mapname,
+            "team_names": world.team_names,
+            "timestamp": self.time(getattr(world, "timestamp", None)),
+            "first_timestamp": self.time(getattr(world, "first_timestamp", None)),
+            "last_timestamp": self.time(getattr(world, "last_timestamp", None))
+        })))
+        write(', "data": [')
+        for index, user in enumerate(users):
+            if index:
+                write(", ")
+            write(json.dumps(self.user_data(user)))
+        write("]}")
+
+class StreamDecoder:
+    """Reads a World written by dump() from a text file, a user at a time.
+
+    Only the World's own fields and the User being decoded are held in
+    memory, the file is read [chunk_size] characters at a time.  users()
+    yields each User as it is decoded, after which 'fields' holds the other
+    World fields.  Counter keys naming users are left as the strings they
+    were written as, until world() resolves them.
+
+    Worlds written with shared tables (see NormalizedEncoder) are read too,
+    their counter keys are Users as soon as they are yielded.
+    """
+    def __init__(self, f, chunk_size=64 * 1024):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+        # length of the last value decoded into objects
+        self.expected = 0
+        self.fields = {}
+        self.normalized = False
+
+    def read(self):
+        """Appends the next chunk of [f] to the buffer, returning False at
+        the end of the file"""
+        if self.eof:
+            return False
+        # grow reads with the value being decoded, so that decoding a large
+        # value is only retried a few times
+        chunk = self.f.read(
+            max(self.chunk_size, len(self.buffer) - self.position)
+        )
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def skip(self):
+        """Returns the next non whitespace character, without consuming it"""
+        while True:
+            while self.position < len(self.buffer):
+                if not self.buffer[self.position].isspace():
+                    return self.buffer[self.position]
+                self.position += 1
+            if not self.read():
+                raise ValueError("Unexpected end of JSON World")
+
+    def expect(self, characters):
+        found = self.skip()
+        if found not in characters:
+            raise ValueError("Expected one of {!r}, found {!r}".format(
+                characters,
+                found
+            ))
+        self.position += 1
+        return found
+
+    def value(self, decoder_class=None):
+        """Decodes the next JSON value, reading on until it is complete.
+
+        With [decoder_class] (such as Decoder), objects are built by a new
+        instance of it.  As those are costly to build twice, values are read
+        ahead by the size of the previous one, and if that was not enough,
+        the end of the value is found by a plain JSONDecoder before building
+        anything again."""
+        self.skip()
+        if decoder_class is None:
+            value, self.position = self.scan()
+            return value
+        while len(self.buffer) - self.position < self.expected:
+            if not self.read():
+                break
+        try:
+            value, end = decoder_class().raw_decode(self.buffer, self.position)
+        except json.JSONDecodeError:
+            end = None
+        if end is None or (end == len(self.buffer) and not self.eof):
+            _, end = self.scan()
+            value, end = decoder_class().raw_decode(
+                self.buffer[:end],
+                self.position
+            )
+        self.expected = end - self.position
+        self.position = end
+        return value
+
+    def scan(self):
+        """Decodes the next JSON value with a plain JSONDecoder, returning
+        it and its end without consuming it"""
+        scanner = json.JSONDecoder()
+        while True:
+            try:
+                value, end = scanner.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if not self.read():
+                    raise
+                continue
+            # a number cut off at the end of the buffer still decodes
+            if end < len(self.buffer) or not self.read():
+                return value, end
+
+    def members(self):
+        """Yields the keys of the JSON object starting here; the caller
+        consumes each value"""
+        self.expect("{")
+        if self.skip() == "}":
+            self.position += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.expect(",}") == "}":
+                return
+
+    def elements(self):
+        """Yields once per element of the JSON array starting here; the
+        caller consumes each element"""
+        self.expect("[")
+        if self.skip() == "]":
+            self.position += 1
+            return
+        while True:
+            yield
+            if self.expect(",]") == "]":
+                return
+
+    def users(self):
+        """Yields each User, then fills 'fields'"""
+        members = self.members()
+        for key in members:
+            if key == "format":
+                yield from self.normalized_users(members)
+                return
+            if key != "known_users":
+                self.fields[key] = self.value(Decoder)
+                continue
+            for _ in self.members():
+                # no backrefs are written across users
+                yield self.value(Decoder)
+
+    def normalized_users(self, members):
+        """Yields each User of a World written by NormalizedEncoder, whose
+        first member, "format", has just been read"""
+        if self.value() != normalized_format:
+            raise ValueError("Unknown JSON World format")
+        self.normalized = True
+        tables = {}
+        for key in members:
+            if key != "data":
+                tables[key] = self.value()
+                continue
+            if tables.get("version") != normalized_version:
+                raise ValueError("Unsupported JSON World version {}".format(
+                    tables.get("version")
+                ))
+            base = tables["base"]
+            strings = tables["strings"]
+            users = [
+                parser.User.from_fields(**fields) for fields in tables["users"]
+            ]
+            for name, value in tables["world"].items():
+                if name.endswith("timestamp") and value is not None:
+                    value = timeseries.from_seconds(base + value)
+                self.fields[name] = value
+            for _, user in zip(self.elements(), users):
+                data = self.value(json.JSONDecoder)
+                for title, by_user, by_string in data["counters"]:
+                    # as built by Counters, child series add values on
+                    # duplicate keys
+                    counter = parser.Counter(
+                        series_class=parser.Counters.series_class,
+                        aggregator=operator.add,
+                        interval=user.interval
+                    )
+                    for index, series in by_user:
+                        counter._values[users[index]] = self.normalized_series(
+                            series,
+                            base,
+                            operator.add
+                        )
+                    for index, series in by_string:
+                        counter._values[strings[index]] = self.normalized_series(
+                            series,
+                            base,
+                            operator.add
+                        )
+                    user.counters[strings[title]] = counter
+                user.positions = self.normalized_series(
+                    data["positions"],
+                    base,
+                    None
+                )
+                yield user
+
+    @staticmethod
+    def normalized_series(data, base, aggregator):
+        """Builds a series written by NormalizedEncoder.series"""
+        series_class = {c.__name__: c for c in binary_series}[data["class"]]
+        datatype = {t.__name__: t for t in binary_datatypes}[data["datatype"]]
+        interval = data["interval"]
+        epoch = None
+        epoch_seconds = 0
+        if "epoch" in data:
+            epoch_seconds, offset = data["epoch"]
+            tzinfo = None
+            if offset is not None:
+                tzinfo = datetime.timezone(datetime.timedelta(seconds=offset))
+            epoch = timeseries.from_seconds(epoch_seconds, tzinfo)
+        shift = (base - epoch_seconds) // interval
+        values = data["values"]
+        if datatype is parser.Location:
+            values = [parser.Location(*coords) for coords in values]
+        buckets = []
+        if values:
+            buckets = list(itertools.accumulate(
+                data["offsets"],
+                initial=data["start"] + shift
+            ))
+        first, last = data["first"], data["last"]
+        return series_class.from_buckets(
+            buckets,
+            values,
+            first=None if first is None else first + shift,
+            last=None if last is None else last + shift,
+            interval=interval,
+            datatype=datatype,
+            keep_last_value=data["keep_last_value"],
+            aggregator=aggregator,
+            epoch=epoch
+        )
+
+    def world(self):
+        """Decodes the whole World"""
+        known_users = {user.steam_id: user for user in self.users()}
+        if self.normalized:
+            world = parser.World()
+            world.known_users = known_users
+            for name, value in self.fields.items():
+                # only set by some lines, so absent unless parsed
+                if value is not None or name == "timestamp":
+                    setattr(world, name, value)
+            return world
+        fields = dict(self.fields, known_users=known_users)
+        if fields.pop("__class__", None) != "World":
+            raise ValueError("Not a JSON World")
+        fields.pop("__id__", None)
+        return parser.World.from_json(fields)
+
+def dump(world, f, normalized=False):
+    """Writes [world] to text file [f] as JSON, see StreamEncoder.
+
+    With [normalized], users, strings and timestamps are written once in
+    shared tables instead, see NormalizedEncoder."""
+    if normalized:
+        NormalizedEncoder(f).encode(world)
+    else:
+        StreamEncoder(f).encode(world)
+
+def load(f):
+    """Reads a World written by dump() from text file [f]"""
+    return StreamDecoder(f).world()
+
+def iter_users(f):
+    """Yields each User of a World written by dump() to text file [f]"""
+    return StreamDecoder(f).users()
+
+# binary snapshots start with this, followed by the format version
+binary_magic = b"TF2W"
+binary_version = 1
+
+# datatypes of series values in binary snapshots, by their stored code
+binary_datatypes = (int, float, parser.Location)
+
+# integer array types tried in turn for series in binary snapshots
+binary_typecodes = ("b", "h", "i", "q")
+
+# series classes in binary snapshots, by their stored code
+binary_series = (timeseries.SparseTimeSeries, timeseries.ArrayTimeSeries)
+
+class BinaryWriter:
+    """Writes a World as a binary snapshot, see dump_binary.
+
+    Integers are written as LEB128 varints (signed ones zigzag encoded)
+    and every string once, in a table ahead of the body, so that the body
+    refers to each string and user by index.  Each series is written as the
+    offsets between its stored intervals and their values, as little endian
+    arrays of the narrowest type holding them, which load with one copy.
+    """
+    def __init__(self):
+        self.body = io.BytesIO()
+        self.strings = {}
+        self.users = {}
+
+    def uint(self, n, out=None):
+        out = out or self.body
+        while n > 0x7f:
+            out.write(bytes((n & 0x7f | 0x80,)))
+            n >>= 7
+        out.write(bytes((n,)))
+
+    def int(self, n):
+        self.uint(n << 1 if n >= 0 else (-n << 1) - 1)
+
+    def optional_int(self, n):
+        if n is None:
+            self.uint(0)
+        else:
+            self.uint(1)
+            self.int(n)
+
+    def string(self, text):
+        index = self.strings.get(text)
+        if index is None:
+            index = self.strings[text] = len(self.strings)
+        self.uint(index)
+
+    def optional_string(self, text):
+        # index 0 stands for None
+        if text is None:
+            self.uint(0)
+        else:
+            index = self.strings.get(text)
+            if index is None:
+                index = self.strings[text] = len(self.strings)
+            self.uint(index + 1)
+
+    def datetime(self, dt):
+        if dt is None:
+            self.uint(0)
+            return
+        self.uint(1)
+        self.int(timeseries.to_seconds(dt))
+        self.uint(dt.microsecond)
+
+    def array(self, values, datatype=int):
+        """Writes the sequence [values] of [datatype] as a typed array"""
+        if datatype is float:
+            typecode = "d"
+        else:
+            low = min(values, default=0)
+            high = max(values, default=0)
+            for typecode in binary_typecodes:
+                limit = 1 << (8 * array.array(typecode).itemsize - 1)
+                if -limit <= low and high < limit:
+                    break
+        values = array.array(typecode, values)
+        if sys.byteorder != "little":
+            values.byteswap()
+        self.uint(ord(typecode))
+        self.uint(len(values))
+        self.body.write(values.tobytes())
+
+    def world(self, world):
+        self.string(world.filename)
+        self.string(world.mapname)
+        self.uint(len(world.team_names))
+        for team, name in world.team_names.items():
+            self.string(team)
+            self.string(name)
+        for name in ("timestamp", "first_timestamp", "last_timestamp"):
+            self.datetime(getattr(world, name, None))
+        users = list(world.known_users.values())
+        self.uint(len(users))
+        for user in users:
+            self.users[id(user)] = len(self.users)
+            self.user_fields(user)
+        for user in users:
+            self.uint(len(user.counters))
+            for title, counter in user.counters.items():
+                self.string(title)
+                self.counter(counter)
+            self.series(user.positions)
+
+    def user_fields(self, user):
+        self.string(user.name)
+        self.string(user.steam_id)
+        self.string(user.team)
+        self.string(user.original_team)
+        self.string(user.server_id)
+        self.optional_string(user.player_class)
+        self.uint(len(user.played_classes))
+        for player_class in user.played_classes:
+            self.string(player_class)
+        self.uint(user.interval)
+
+    def counter(self, counter):
+        self.uint(len(counter._values))
+        for key, series in counter._values.items():
+            if isinstance(key, parser.User):
+                index = self.users.get(id(key))
+                if index is None:
+                    # not one of this world's users, keep it by name as
+                    # the JSON encoder does
+                    self.uint(0)
+                    self.string('''"{}"'''.format(str(key)))
+                else:
+                    self.uint(1)
+                    self.uint(index)
+            elif isinstance(key, str):
+                self.uint(0)
+                self.string(key)
+            else:
+                raise TypeError("Cannot write counter key {!r}".format(key))
+            self.series(series)
+
+    def series(self, series):
+        kind = binary_series.index(series.__class__)
+        self.uint(kind)
+        self.uint(binary_datatypes.index(series.datatype))
+        self.uint(series.interval)
+        self.uint(series.keep_last_value)
+        if series.epoch == timeseries.unix_epoch:
+            self.uint(0)
+        else:
+            offset = series.epoch.utcoffset()
+            if offset is None:
+                self.uint(1)
+            else:
+                self.uint(2)
+                self.int(offset.days * 86400 + offset.seconds)
+            self.int(timeseries.to_seconds(series.epoch))
+        self.optional_int(series._first)
+        self.optional_int(series._last)
+        if series.__class__ is timeseries.ArrayTimeSeries:
+            if series._origin is None:
+                buckets, values = [], []
+            else:
+                origin = series._origin
+                present = series._present
+                data = series._data
+                indices = [i for i in range(len(present)) if present[i]]
+                buckets = [origin + i for i in indices]
+                values = [data[i] for i in indices]
+        else:
+            buckets = series._keys
+            values = [series._values[bucket] for bucket in buckets]
+        # intervals as offsets from the previous one, which stay small
+        self.int(buckets[0] if buckets else 0)
+        self.array([b - a for a, b in zip(buckets, buckets[1:])])
+        if series.datatype is parser.Location:
+            self.array([
+                c for location in values
+                for c in (location.x, location.y, location.z)
+            ])
+        else:
+            self.array(values, series.datatype)
+
+    def write(self, world, f):
+        self.world(world)
+        f.write(binary_magic)
+        self.uint(binary_version, f)
+        self.uint(len(self.strings), f)
+        for text in self.strings:
+            encoded = text.encode("utf-8", "surrogatepass")
+            self.uint(len(encoded), f)
+            f.write(encoded)
+        f.write(self.body.getbuffer())
+
+class BinaryReader:
+    """Reads a binary snapshot written by BinaryWriter, see load_binary"""
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.position = 0
+        self.strings = []
+        self.users = []
+
+    def uint(self):
+        data = self.data
+        position = self.position
+        n = shift = 0
+        while True:
+            byte = data[position]
+            position += 1
+            n |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        self.position = position
+        return n
+
+    def int(self):
+        n = self.uint()
+        return -((n + 1) >> 1) if n & 1 else n >> 1
+
+    def optional_int(self):
+        if self.uint():
+            return self.int()
+        return None
+
+    def string(self):
+        return self.strings[self.uint()]
+
+    def optional_string(self):
+        index = self.uint()
+        if index == 0:
+            return None
+        return self.strings[index - 1]
+
+    def bytes(self, length):
+        end = self.position + length
+        if end > len(self.data):
+            raise ValueError("Truncated binary snapshot")
+        value = self.data[self.position:end]
+        self.position = end
+        return value
+
+    def datetime(self):
+        if not self.uint():
+            return None
+        seconds = self.int()
+        return timeseries.from_seconds(seconds) + datetime.timedelta(
+            microseconds=self.uint()
+        )
+
+    def array(self):
+        values = array.array(chr(self.uint()))
+        length = self.uint()
+        values.frombytes(self.bytes(length * values.itemsize))
+        if sys.byteorder != "little":
+            values.byteswap()
+        return values
+
+    def header(self):
+        if bytes(self.bytes(len(binary_magic))) != binary_magic:
+            raise ValueError("Not a binary World snapshot")
+        version = self.uint()
+        if version != binary_version:
+            raise ValueError(
+                "Unsupported snapshot version {}".format(version)
+            )
+        self.strings = [
+            str(self.bytes(self.uint()), "utf-8", "surrogatepass")
+            for _ in range(self.uint())
+        ]
+
+    def world(self):
+        self.header()
+        world = parser.World()
+        world.filename = self.string()
+        world.mapname = self.string()
+        world.team_names = {
+            self.string(): self.string() for _ in range(self.uint())
+        }
+        world.timestamp = self.datetime()
+        # only set by some lines, so absent unless parsed
+        for name in ("first_timestamp", "last_timestamp"):
+            value = self.datetime()
+            if value is not None:
+                setattr(world, name, value)
+        self.users = [self.user_fields() for _ in range(self.uint())]
+        for user in self.users:
+            world.known_users[user.steam_id] = user
+            for _ in range(self.uint()):
+                title = self.string()
+                user.counters[title] = self.counter(user.interval)
+            user.positions = self.series(None)
+        return world
+
+    def user_fields(self):
+        name = self.string()
+        steam_id = self.string()
+        team = self.string()
+        original_team = self.string()
+        server_id = self.string()
+        player_class = self.optional_string()
+        played_classes = [self.string() for _ in range(self.uint())]
+        return parser.User.from_fields(
+            name,
+            steam_id,
+            team,
+            server_id,
+            interval=self.uint(),
+            original_team=original_team,
+            player_class=player_class,
+            played_classes=played_classes
+        )
+
+    def counter(self, interval):
+        # as built by Counters, child series add values on duplicate keys
+        counter = parser.Counter(
+            series_class=parser.Counters.series_class,
+            aggregator=operator.add,
+            interval=interval
+        )
+        for _ in range(self.uint()):
+            if self.uint():
+                key = self.users[self.uint()]
+            else:
+                key = self.string()
+            counter._values[key] = self.series(operator.add)
+        return counter
+
+    def series(self, aggregator):
+        series_class = binary_series[self.uint()]
+        datatype = binary_datatypes[self.uint()]
+        interval = self.uint()
+        keep_last_value = bool(self.uint())
+        epoch_kind = self.uint()
+        if epoch_kind == 0:
+            epoch = None
+        else:
+            tzinfo = None
+            if epoch_kind == 2:
+                tzinfo = datetime.timezone(
+                    datetime.timedelta(seconds=self.int())
+                )
+            epoch = timeseries.from_seconds(self.int(), tzinfo)
+        kwargs = {
+            "interval": interval,
+            "datatype": datatype,
+            "keep_last_value": keep_last_value,
+            "aggregator": aggregator,
+            "epoch": epoch,
+            "first": self.optional_int(),
+            "last": self.optional_int()
+        }
+        start = self.int()
+        offsets = self.array()
+        if datatype is parser.Location:
+            coords = self.array()
+            values = [
+                parser.Location(*coords[i:i + 3])
+                for i in range(0, len(coords), 3)
+            ]
+        else:
+            values = self.array()
+        if values:
+            buckets = list(itertools.accumulate(offsets, initial=start))
+        else:
+            buckets = []
+        return series_class.from_buckets(buckets, values, **kwargs)
+
+def dump_binary(world, f):
+    """Writes [world] to binary file [f] as a compact binary snapshot.
+
+    Snapshots hold a string table, a user table and the values of each
+    series as arrays of interval offsets, rather than one JSON object per
+    interval, so they are far smaller and faster to load than dump().
+    Counter series are restored with the aggregator Counters gives them
+    (addition) and positions with the default one.
+    """
+    BinaryWriter().write(world, f)
+
+def load_binary(f):
+    """Reads a World written by dump_binary() from binary file [f].
+
+    Raises ValueError if [f] does not hold a whole, valid snapshot."""
+    try:
+        return BinaryReader(f.read()).world()
+    except (IndexError, KeyError, TypeError, OverflowError) as e:
+        # a truncated or damaged snapshot reads past its end or its tables
+        raise ValueError("Damaged binary snapshot") from e
+
+def save(world, path, binary=True, normalized=False):
+    """Writes [world] to the file at [path], see dump_binary and dump"""
+    if binary:
+        with open(path, "wb") as f:
+            dump_binary(world, f)
+    else:
+        with open(path, "w") as f:
+            dump(world, f, normalized)
+
+def restore(path):
+    """Reads a World from the file at [path], in either format"""
+    with open(path, "rb") as f:
+        if f.read(len(binary_magic)) == binary_magic:
+            f.seek(0)
+            return load_binary(f)
+    with open(path) as f:
+        return load(f)
@@ -0,0 +1,40 @@
+import cache
+from test_serializers import parse, sample_lines, snapshot
+
+def write_log(tmp_path, lines):
+    path = str(tmp_path / "sample.log")
+    with open(path, "w") as f:
+        f.write("".join(line + "\n" for line in lines))
+    return path
+
+def test_hit_matches_parse(tmp_path):
+    path = write_log(tmp_path, sample_lines)
+    store = cache.Cache(str(tmp_path / "cache"))
+    parsed = store.read_log(path)
+    assert store.misses == 1
+    cached = store.read_log(path)
+    assert store.hits == 1
+    assert snapshot(cached) == snapshot(parsed) == snapshot(parse(sample_lines))
+
+def test_changed_log_misses(tmp_path):
+    store = cache.Cache(str(tmp_path / "cache"))
+    store.read_log(write_log(tmp_path, sample_lines[:5]))
+    world = store.read_log(write_log(tmp_path, sample_lines))
+    assert (store.hits, store.misses) == (0, 2)
+    assert snapshot(world) == snapshot(parse(sample_lines))
+
+def test_truncated_entry_misses(tmp_path):
+    path = write_log(tmp_path, sample_lines)
+    store = cache.Cache(str(tmp_path / "cache"))
+    store.read_log(path)
+    entry = store.entry(store.key(path))
+    with open(entry, "rb") as f:
+        data = f.read()
+    with open(entry, "wb") as f:
+        f.write(data[:len(data) // 2])
+    assert store.get(path) is None
+    assert store.misses == 2
+    # the damaged entry is parsed again and replaced
+    world = store.read_log(path)
+    assert snapshot(world) == snapshot(parse(sample_lines))
+    assert store.get(path) is not None
@@ -0,0 +1,61 @@
+import os
+import columnar
+import parser
+
+charge_lines = [
+    'L 03/21/2016 - 20:00:08: "player 0<2><[U:1:1000]><Red>" triggered "chargedeployed" (medigun "medigun") (foo "1")',
+    'L 03/21/2016 - 20:00:44: "player 0<2><[U:1:1000]><Red>" triggered "chargedeployed" (medigun "medigun") (foo "1.5")',
+    'L 03/21/2016 - 20:01:02: "player 6<8><[U:1:1006]><Blue>" triggered "chargedeployed" (medigun "kritzkrieg")'
+]
+
+def write(directory, lines, **kwargs):
+    world = parser.World()
+    with columnar.ColumnWriter(directory, **kwargs) as writer:
+        return list(writer.sink(world.read_log(lines)))
+
+def test_kind_change_gets_its_own_column(tmp_path):
+    directory = str(tmp_path)
+    lines = write(directory, charge_lines)
+    event = lines[0].__class__.__name__
+    with columnar.ColumnStore(directory) as store:
+        assert store.rows(event) == 3
+        assert store.columns(event)["data.foo"] == "int"
+        assert store.columns(event)["data.foo:float"] == "float"
+        assert list(store.values(event, "data.foo")) == [1, None, None]
+        assert list(store.values(event, "data.foo:float")) == [None, 1.5, None]
+        assert list(store.values(event, "data.medigun")) == [
+            "medigun", "medigun", "kritzkrieg"
+        ]
+        assert store.where(event, {"source": "[U:1:1006]"}) == [2]
+
+def test_values_map_each_column_once(tmp_path):
+    directory = str(tmp_path)
+    lines = write(directory, charge_lines * 200)
+    event = lines[0].__class__.__name__
+    with columnar.ColumnStore(directory) as store:
+        values = [
+            store.value(event, "source", row)
+            for row in range(store.rows(event))
+        ]
+        assert values == [line.source.steam_id for line in lines]
+        assert len(store.maps) == 1
+
+def test_reopening_drops_rows_missing_from_the_schema(tmp_path):
+    directory = str(tmp_path)
+    lines = write(directory, charge_lines[:1])
+    event = lines[0].__class__.__name__
+    # rows flushed to one column by a writer that died before the schema
+    path = os.path.join(directory, event, "timestamp" + columnar.column_suffix)
+    with open(path, "ab") as f:
+        f.write(b"\0" * 8 * 5)
+    write(directory, charge_lines[1:])
+    with columnar.ColumnStore(directory) as store:
+        assert store.rows(event) == 3
+        for name in store.columns(event):
+            size = os.path.getsize(
+                os.path.join(directory, event, name + columnar.column_suffix)
+            )
+            assert size == 3 * store.column(event, name).itemsize
+        assert [t.second for t in store.values(event, "timestamp")] == [
+            8, 44, 2
+        ]
@@ -0,0 +1,51 @@
+import batch
+import checkpoint
+import parser
+import readers
+
+sample_lines = [
+    'L 03/21/2016 - 20:00:00: Log file started (file "logs/L0321006.log") (game "/home/tf") (version "3283415")',
+    'L 03/21/2016 - 20:00:00: Loading map "cp_badlands"',
+    'L 03/21/2016 - 20:00:00: "player 0<2><[U:1:1000]><Unassigned>" joined team "Red"',
+    'L 03/21/2016 - 20:00:00: "player 0<2><[U:1:1000]><Red>" changed role to "Scout"',
+    'L 03/21/2016 - 20:00:01: "player 6<8><[U:1:1006]><Blue>" spawned as "Medic"',
+    'L 03/21/2016 - 20:00:01: "player 1<3><[U:1:1001]><Red>" triggered "damage" against "player 6<8><[U:1:1006]><Blue>" (damage "16") (realdamage "29") (weapon "sniperrifle") (airshot "1")',
+    'L 03/21/2016 - 20:00:02: "player 1<3><[U:1:1001]><Red>" killed "player 6<8><[U:1:1006]><Blue>" with "sniperrifle" (attacker_position "-1 2 3") (victim_position "4 5 -6")',
+    'L 03/21/2016 - 20:00:03: "player 6<8><[U:1:1006]><Blue>" say "gg"',
+    'L 03/21/2016 - 20:00:04: Log file closed.'
+]
+
+def parse(path, binary):
+    world = parser.World()
+    lines = [
+        line.__class__.__name__
+        for line in world.read_log(path, binary=binary)
+    ]
+    return lines, sorted(world.known_users)
+
+def test_binary_matches_text_with_crlf(tmp_path):
+    path = str(tmp_path / "crlf.log")
+    with open(path, "wb") as f:
+        f.write("".join(line + "\r\n" for line in sample_lines).encode())
+    text = parse(path, binary=False)
+    assert len(text[0]) == len(sample_lines)
+    assert parse(path, binary=True) == text
+    chunk = batch.extract_chunk(path, 0, len(open(path, "rb").read()))
+    assert [event[0].__name__ for event in chunk] == text[0]
+    for binary in (True, False):
+        with readers.Follower(path, binary=binary) as follower:
+            lines = follower.poll()
+            if not binary:
+                lines = (line.decode() for line in lines)
+            followed = [
+                parser.Line.identify(parser.World(), line).__class__.__name__
+                for line in lines
+            ]
+        assert followed == text[0]
+    for binary in (True, False):
+        checkpointed = checkpoint.read_log(
+            path,
+            str(tmp_path / "crlf.{}.checkpoint".format(binary)),
+            binary=binary
+        )
+        assert [line.__class__.__name__ for line in checkpointed] == text[0]
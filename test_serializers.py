@@ -0,0 +1,121 @@
+import io
+import parser
+import serializers
+
+sample_lines = [
+    'L 03/21/2016 - 20:00:00: Log file started (file "logs/L0321006.log") (game "/home/tf") (version "3283415")',
+    'L 03/21/2016 - 20:00:00: Loading map "cp_badlands"',
+    'L 03/21/2016 - 20:00:00: "player 0<2><[U:1:1000]><Unassigned>" joined team "Red"',
+    'L 03/21/2016 - 20:00:00: "player 0<2><[U:1:1000]><Red>" changed role to "Scout"',
+    'L 03/21/2016 - 20:00:01: "player 6<8><[U:1:1006]><Blue>" spawned as "Medic"',
+    'L 03/21/2016 - 20:00:01: "player 0<2><[U:1:1000]><Red>" triggered "damage" against "player 6<8><[U:1:1006]><Blue>" (damage "16") (realdamage "29") (weapon "scattergun")',
+    'L 03/21/2016 - 20:00:03: "player 0<2><[U:1:1000]><Red>" triggered "damage" against "player 6<8><[U:1:1006]><Blue>" (damage "40") (weapon "scattergun") (airshot "1")',
+    'L 03/21/2016 - 20:00:04: "player 0<2><[U:1:1000]><Red>" killed "player 6<8><[U:1:1006]><Blue>" with "scattergun" (attacker_position "-1 2 3") (victim_position "4 5 -6")',
+    'L 03/21/2016 - 20:00:05: "player 6<8><[U:1:1006]><Blue>" say "gg"',
+    'L 03/21/2016 - 20:01:12: "player 6<8><[U:1:1006]><Blue>" triggered "damage" against "player 0<2><[U:1:1000]><Red>" (damage "24") (weapon "syringegun_medic")',
+    'L 03/21/2016 - 20:01:12: "player 6<8><[U:1:1006]><Blue>" triggered "damage" against "player 0<2><[U:1:1000]><Red>" (damage "12") (weapon "syringegun_medic")',
+    'L 03/21/2016 - 20:01:30: "player 0<2><[U:1:1000]><Red>" killed "player 6<8><[U:1:1006]><Blue>" with "scattergun" (attacker_position "7 8 9") (victim_position "10 11 12")',
+    'L 03/21/2016 - 20:02:00: Log file closed.'
+]
+
+# lines parsed before a dump, the rest are parsed after loading it
+split = 7
+
+def parse(lines, world=None):
+    if world is None:
+        world = parser.World()
+    for _ in world.read_log(lines):
+        pass
+    return world
+
+def snapshot(world):
+    """Returns the parsed state of [world] as plain, comparable data"""
+    users = {}
+    for steam_id, user in world.known_users.items():
+        counters = {}
+        for title, counter in user.counters.items():
+            counters[title] = (
+                sorted(
+                    (str(key), series.sum(), list(series.items()))
+                    for key, series in counter.items()
+                ),
+                list(counter.totals.items())
+            )
+        users[steam_id] = (
+            user.name,
+            user.team,
+            sorted(user.played_classes),
+            counters,
+            [
+                (timestamp, (location.x, location.y, location.z))
+                for timestamp, location in user.positions.items()
+            ]
+        )
+    return (world.mapname, dict(world.team_names), world.timestamp, users)
+
+def binary_round_trip(world):
+    f = io.BytesIO()
+    serializers.dump_binary(world, f)
+    f.seek(0)
+    return serializers.load_binary(f)
+
+def test_binary_round_trip():
+    world = parse(sample_lines)
+    assert snapshot(binary_round_trip(world)) == snapshot(world)
+
+def test_binary_resume_after_load():
+    world = binary_round_trip(parse(sample_lines[:split]))
+    parse(sample_lines[split:], world)
+    assert snapshot(world) == snapshot(parse(sample_lines))
+
+def test_binary_truncated():
+    f = io.BytesIO()
+    serializers.dump_binary(parse(sample_lines), f)
+    data = f.getvalue()
+    for end in range(0, len(data), 7):
+        try:
+            serializers.load_binary(io.BytesIO(data[:end]))
+        except ValueError:
+            continue
+        raise AssertionError("loaded {} of {} bytes".format(end, len(data)))
+
+def json_round_trip(world, chunk_size=64 * 1024, normalized=False):
+    f = io.StringIO()
+    serializers.dump(world, f, normalized)
+    f.seek(0)
+    return serializers.StreamDecoder(f, chunk_size).world()
+
+def test_stream_round_trip():
+    world = parse(sample_lines)
+    for chunk_size in (1, 7, 64 * 1024):
+        loaded = json_round_trip(world, chunk_size)
+        assert snapshot(loaded) == snapshot(world)
+
+def test_stream_resume_after_load():
+    world = json_round_trip(parse(sample_lines[:split]))
+    parse(sample_lines[split:], world)
+    assert snapshot(world) == snapshot(parse(sample_lines))
+
+def test_stream_users():
+    world = parse(sample_lines)
+    f = io.StringIO()
+    serializers.dump(world, f)
+    f.seek(0)
+    users = {user.steam_id: user for user in serializers.iter_users(f)}
+    assert sorted(users) == sorted(world.known_users)
+    for steam_id, user in users.items():
+        assert user.name == world.known_users[steam_id].name
+        assert sorted(user.counters) == sorted(
+            world.known_users[steam_id].counters
+        )
+
+def test_normalized_round_trip():
+    world = parse(sample_lines)
+    for chunk_size in (1, 64 * 1024):
+        loaded = json_round_trip(world, chunk_size, normalized=True)
+        assert snapshot(loaded) == snapshot(world)
+
+def test_normalized_resume_after_load():
+    world = json_round_trip(parse(sample_lines[:split]), normalized=True)
+    parse(sample_lines[split:], world)
+    assert snapshot(world) == snapshot(parse(sample_lines))
@@ -1,5 +1,53 @@
+import array
+import bisect
 import datetime
 
+# naive datetimes are bucketed as wall clock time counted from this epoch
+unix_epoch = datetime.datetime(1970, 1, 1)
+unix_epoch_ordinal = unix_epoch.toordinal()
+
+# the datetime last converted by to_seconds without tzinfo, and the result.
+# Log lines within the same second share one datetime object, so most
+# conversions while parsing are answered by an identity check.
+last_conversion = (None, None)
+
+def to_seconds(ts, tzinfo=None):
+    """Returns the whole seconds from unix_epoch to [ts].
+
+    Naive datetimes are taken as wall clock time in [tzinfo], or as UTC if
+    [tzinfo] is None, so the result never depends on the timezone of the
+    host.  Only integer arithmetic on the fields of [ts] is used, no
+    datetime objects are created."""
+    global last_conversion
+    if tzinfo is None:
+        last_ts, last_seconds = last_conversion
+        if ts is last_ts:
+            return last_seconds
+    seconds = (
+        (ts.toordinal() - unix_epoch_ordinal) * 86400
+        + ts.hour * 3600 + ts.minute * 60 + ts.second
+    )
+    if ts.tzinfo is not None:
+        offset = ts.utcoffset()
+        seconds -= offset.days * 86400 + offset.seconds
+    elif tzinfo is not None:
+        offset = tzinfo.utcoffset(ts)
+        return seconds - offset.days * 86400 - offset.seconds
+    last_conversion = (ts, seconds)
+    return seconds
+
+def from_seconds(seconds, tzinfo=None):
+    """Returns the datetime [seconds] after unix_epoch.
+
+    The inverse of to_seconds: naive unless [tzinfo] is given."""
+    if tzinfo is None:
+        return unix_epoch + datetime.timedelta(seconds=seconds)
+    return datetime.datetime.fromtimestamp(seconds, tzinfo)
+
+def replace(old, new):
+    """Default aggregator, keeps the newest value"""
+    return new
+
 class SparseTimeSeries:
     """A time series store with unique values every [interval] seconds.
 
@@ -8,7 +56,10 @@ class SparseTimeSeries:
     be returned (default int(), or 0).  The value for [interval] must always be
     of type 'int'.
 
-    WARNING: Using keep_last_value=True will result in O(nlog(n)) iteration.
+    With keep_last_value=True, missing values repeat the last value before
+    them.  Iteration carries the last value forward in a single pass, and
+    point lookups of missing intervals bisect a sorted index of the stored
+    intervals, so both stay O(n) and O(log(n)) respectively.
 
     Only objects of type 'datetime.datetime' are considered valid keys.  Every
     key will be converted to the earliest possible datetime within its interval
@@ -24,7 +75,28 @@ class SparseTimeSeries:
     >>> ts[now] = 1
     >>> ts
     SparseTimeSeries({datetime.datetime(2016, 4, 1, 17, 3, 44): 2})
+
+    Intervals are counted in whole seconds from [epoch] (default
+    1970-01-01), using integer arithmetic only, so bucketing does not depend
+    on the timezone of the host.  Naive keys are treated as wall clock time
+    and aware keys are converted to UTC.  If [epoch] is timezone aware,
+    intervals are counted in UTC, naive keys are taken to be in the
+    timezone of [epoch], and keys are returned in that timezone.
     """
+    __slots__ = (
+        "_first",
+        "_last",
+        "interval",
+        "epoch",
+        "_epoch_seconds",
+        "datatype",
+        "keep_last_value",
+        "aggregator",
+        "_values",
+        "_keys",
+        "_version"
+    )
+
     def __init__(
             self,
             interval=1,
@@ -32,47 +104,73 @@ class SparseTimeSeries:
             keep_last_value=False,
             aggregator=None,
             first_timestamp=None,
-            last_timestamp=None
+            last_timestamp=None,
+            epoch=None
         ):
         """Initializes a sparse time series"""
-        self.first_timestamp = first_timestamp
-        self.last_timestamp = last_timestamp
+        # incremented on every change, used by readers caching results
+        self._version = 0
         if isinstance(interval, int):
             self.interval = interval
+        if epoch is None:
+            epoch = unix_epoch
+        self.epoch = epoch
+        self._epoch_seconds = to_seconds(epoch)
+        self.first_timestamp = first_timestamp
+        self.last_timestamp = last_timestamp
         self.datatype = datatype
         self.keep_last_value = keep_last_value
         if aggregator is None:
-            self.aggregator = lambda old, new: new
+            self.aggregator = replace
         else:
             self.aggregator = aggregator
+        # values keyed by interval index, see bucket()
         self._values = {}
+        # sorted interval indices of self._values
+        self._keys = []
+
+    @property
+    def first_timestamp(self):
+        if self._first is None:
+            return None
+        return self.bucket_time(self._first)
+
+    @first_timestamp.setter
+    def first_timestamp(self, ts):
+        self._first = None if ts is None else self.bucket(ts)
+        self._version += 1
+
+    @property
+    def last_timestamp(self):
+        if self._last is None:
+            return None
+        return self.bucket_time(self._last)
+
+    @last_timestamp.setter
+    def last_timestamp(self, ts):
+        self._last = None if ts is None else self.bucket(ts)
+        self._version += 1
 
     def __len__(self):
         """Returns the length of the time series"""
-        if self.first_timestamp is None or self.last_timestamp is None:
+        if self._first is None or self._last is None:
             return 0
-        return int(
-            (self.last_timestamp - self.first_timestamp).total_seconds()
-        ) // self.interval + 1
+        return self._last - self._first + 1
 
     def __getitem__(self, key):
         """Gets the value at interval [key]"""
         if not isinstance(key, datetime.datetime):
             raise TypeError("Keys must be of type datetime.datetime")
-        base_key = self.floor_time(key)
-        if base_key in self._values:
-            return self._values[base_key]
+        bucket = self.bucket(key)
+        if bucket in self._values:
+            return self._values[bucket]
         # if we /should/ know this, return the default constructor or the
         # last value in the sequence (if self.keep_last_value)
-        if self.first_timestamp <= base_key <= self.last_timestamp:
+        if len(self) and self._first <= bucket <= self._last:
             if self.keep_last_value:
-                last_value = None
-                for ts in self: # use our __iter__
-                    # we already know base_key is not in self._values
-                    if ts in self._values:
-                        last_value = self._values[ts]
-                    elif ts == base_key and last_value is not None:
-                        return last_value
+                index = bisect.bisect_left(self._keys, bucket) - 1
+                if index >= 0 and self._keys[index] >= self._first:
+                    return self._values[self._keys[index]]
             # if we fall through to this point, default constructor
             return self.datatype()
         raise KeyError(key)
@@ -85,40 +183,38 @@ class SparseTimeSeries:
             raise ValueError("Value {} is not of type {}".format(
                 repr(value), repr(self.datatype)
             ))
-        base_key = self.floor_time(key)
+        bucket = self.bucket(key)
+        self._version += 1
         # track first and last timestamps
-        if self.first_timestamp is None:
-            self.first_timestamp = base_key
-        if self.last_timestamp is None:
-            self.last_timestamp = base_key
-        if base_key < self.first_timestamp:
-            self.first_timestamp = base_key
-        if base_key > self.last_timestamp:
-            self.last_timestamp = base_key
+        if self._first is None or bucket < self._first:
+            self._first = bucket
+        if self._last is None or bucket > self._last:
+            self._last = bucket
         # resolve duplicates
-        if base_key in self._values:
-            self._values[base_key] = self.aggregator(
-                self._values[base_key], value
+        if bucket in self._values:
+            self._values[bucket] = self.aggregator(
+                self._values[bucket], value
             )
         else:
-            self._values[base_key] = value
+            self._values[bucket] = value
+            # keys mostly arrive in order, so appending is the common case
+            if not self._keys or bucket > self._keys[-1]:
+                self._keys.append(bucket)
+            else:
+                bisect.insort(self._keys, bucket)
 
     def __iter__(self):
         """Iterates over keys in our time range"""
         if len(self) == 0:
             return
-        current = self.first_timestamp
-        delta = datetime.timedelta(0, self.interval)
-        while current <= self.last_timestamp:
-            yield current
-            current += delta
+        for bucket in range(self._first, self._last + 1):
+            yield self.bucket_time(bucket)
 
     def __contains__(self, ts):
         """Tests whether ts is in this time interval"""
-        if not isinstance(ts, datetime.datetime):
+        if not isinstance(ts, datetime.datetime) or len(self) == 0:
             return False
-        base_key = self.floor_time(key)
-        return self.first_timestamp <= base_key <= self.last_timestamp
+        return self._first <= self.bucket(ts) <= self._last
 
     def __repr__(self):
         """Represents the interval"""
@@ -130,14 +226,24 @@ class SparseTimeSeries:
 
     def floor_time(self, ts):
         """Returns the floor function for [ts] based on self.interval"""
-        return datetime.datetime.fromtimestamp(
-            int(ts.timestamp()) // self.interval * self.interval
+        return self.bucket_time(self.bucket(ts))
+
+    def bucket(self, ts):
+        """Returns the integer index of the interval containing [ts]"""
+        return (
+            to_seconds(ts, self.epoch.tzinfo) - self._epoch_seconds
+        ) // self.interval
+
+    def bucket_time(self, bucket):
+        """Returns the starting time of the interval at index [bucket]"""
+        return from_seconds(
+            self._epoch_seconds + bucket * self.interval,
+            self.epoch.tzinfo
         )
 
     def items(self):
         """Iterates over the time period, producing tuples of time series"""
-        for ts in self:
-            yield ts, self[ts]
+        return zip(self.keys(), self.values())
 
     def keys(self):
         """Iterates over the time period, producing keys of time series"""
@@ -146,40 +252,60 @@ class SparseTimeSeries:
 
     def values(self):
         """Iterates over the time period, producing values of time series"""
-        for ts in self:
-            yield self[ts]
+        if len(self) == 0:
+            return
+        values = self._values
+        datatype = self.datatype
+        last_value = None
+        for bucket in range(self._first, self._last + 1):
+            if bucket in values:
+                last_value = values[bucket]
+                yield last_value
+            elif self.keep_last_value and last_value is not None:
+                yield last_value
+            else:
+                # a fresh default each time, as for __getitem__
+                yield datatype()
 
     def set_start(self, ts):
         """Sets the starting timestamp for the series.
 
         If the current starting timestamp is less than [ts], no effect.
         """
-        base_key = self.floor_time(ts)
-        if self.first_timestamp is None or base_key < self.first_timestamp:
-            self.first_timestamp = base_key
+        bucket = self.bucket(ts)
+        if self._first is None or bucket < self._first:
+            self._first = bucket
+            self._version += 1
 
     def set_end(self, ts):
         """Sets the ending timestamp for the series.
 
         If the current ending timestamp is greater than [ts], no effect.
         """
-        base_key = self.floor_time(ts)
-        if self.last_timestamp is None or base_key > self.last_timestamp:
-            self.last_timestamp = base_key
+        bucket = self.bucket(ts)
+        if self._last is None or bucket > self._last:
+            self._last = bucket
+            self._version += 1
 
     def sum(self):
         """Returns the sum of all values in the time series"""
         return sum(self._values.values())
 
     def repr_json(self):
-        return {
+        result = {
             "first_timestamp": self.first_timestamp,
             "last_timestamp": self.last_timestamp,
-            "values": list(self._values.items()),
+            "values": [
+                (self.bucket_time(bucket), value)
+                for bucket, value in self._values.items()
+            ],
             "interval": self.interval,
             "datatype": self.datatype.__name__,
             "keep_last_value": self.keep_last_value
         }
+        if self.epoch != unix_epoch:
+            result["epoch"] = self.epoch
+        return result
 
     @classmethod
     def from_json(cls, data):
@@ -187,10 +313,232 @@ class SparseTimeSeries:
             first_timestamp=data["first_timestamp"],
             last_timestamp=data["last_timestamp"],
             interval=data["interval"],
-            keep_last_value=data["keep_last_value"]
+            keep_last_value=data["keep_last_value"],
+            epoch=data.get("epoch")
         )
-        obj._values = dict(data["values"])
+        obj._values = {
+            obj.bucket(ts): value for ts, value in data["values"]
+        }
+        obj._keys = sorted(obj._values)
         if len(obj._values):
             first_value = list(obj._values.values())[0]
             obj.datatype = first_value.__class__
         return obj
+
+    @classmethod
+    def from_buckets(cls, buckets, values, first=None, last=None, **kwargs):
+        """Builds a series from interval indices (see bucket()) and their
+        values.  [first] and [last] are interval indices as well, and
+        [kwargs] are passed to the constructor."""
+        obj = cls(**kwargs)
+        obj._values = dict(zip(buckets, values))
+        obj._keys = sorted(obj._values)
+        obj._first = first
+        obj._last = last
+        return obj
+
+class ArrayTimeSeries(SparseTimeSeries):
+    """A SparseTimeSeries of int or float values backed by a typed array.
+
+    Values are kept in one contiguous array indexed by interval, relative to
+    the earliest interval stored, so iterating, summing and totalling never
+    go through a dict lookup or datetime arithmetic per interval.  A parallel
+    bytearray records which intervals have been assigned, so [aggregator]
+    still only applies to duplicate keys.  The public API is the same as
+    SparseTimeSeries.
+
+    >>> ts = ArrayTimeSeries(aggregator=lambda old, new: old + new)
+    >>> now = datetime.datetime(2016, 4, 1, 17, 3, 44, 18797)
+    >>> ts[now] = 1
+    >>> ts[now] = 1
+    >>> ts.sum()
+    2
+    """
+    __slots__ = ("_origin", "_data", "_present")
+    typecodes = {
+        int: "q",
+        float: "d"
+    }
+
+    def __init__(self, *args, **kwargs):
+        """Initializes an array backed time series"""
+        super().__init__(*args, **kwargs)
+        if self.datatype not in self.typecodes:
+            raise ValueError("No array type for {}".format(
+                repr(self.datatype)
+            ))
+        self._origin = None
+        self._data = array.array(self.typecodes[self.datatype])
+        self._present = bytearray()
+
+    def __getitem__(self, key):
+        """Gets the value at interval [key]"""
+        if not isinstance(key, datetime.datetime):
+            raise TypeError("Keys must be of type datetime.datetime")
+        bucket = self.bucket(key)
+        if len(self) == 0 or not self._first <= bucket <= self._last:
+            raise KeyError(key)
+        index = self._index(bucket)
+        if index is not None and self._present[index]:
+            return self._data[index]
+        if self.keep_last_value and self._origin is not None:
+            # walk back to the latest assigned interval, if any
+            end = min(max(bucket - self._origin, 0), len(self._data))
+            last = self._present.rfind(1, 0, end)
+            if last >= 0:
+                return self._data[last]
+        return self.datatype()
+
+    def __setitem__(self, key, value):
+        """Sets the value at interval [key]"""
+        if not isinstance(key, datetime.datetime):
+            raise TypeError("Keys must be of type datetime.datetime")
+        if not isinstance(value, self.datatype):
+            raise ValueError("Value {} is not of type {}".format(
+                repr(value), repr(self.datatype)
+            ))
+        bucket = self.bucket(key)
+        self._version += 1
+        # track first and last timestamps
+        if self._first is None or bucket < self._first:
+            self._first = bucket
+        if self._last is None or bucket > self._last:
+            self._last = bucket
+        index = self._grow(bucket)
+        # resolve duplicates
+        if self._present[index]:
+            self._data[index] = self.aggregator(self._data[index], value)
+        else:
+            self._data[index] = value
+            self._present[index] = 1
+
+    def _index(self, bucket):
+        """Returns the array index of [bucket], or None if not stored"""
+        if self._origin is None:
+            return None
+        index = bucket - self._origin
+        if 0 <= index < len(self._data):
+            return index
+        return None
+
+    def _grow(self, bucket):
+        """Extends the arrays to cover [bucket] and returns its index"""
+        if self._origin is None:
+            self._origin = bucket
+        if bucket < self._origin:
+            pad = self._origin - bucket
+            self._data[0:0] = array.array(
+                self._data.typecode,
+                bytes(pad * self._data.itemsize)
+            )
+            self._present[0:0] = bytes(pad)
+            self._origin = bucket
+        end = self._origin + len(self._data)
+        if bucket >= end:
+            pad = bucket - end + 1
+            self._data.frombytes(bytes(pad * self._data.itemsize))
+            self._present.extend(bytes(pad))
+        return bucket - self._origin
+
+    def items(self):
+        """Iterates over the time period, producing tuples of time series"""
+        return zip(self.keys(), self.values())
+
+    def values(self):
+        """Iterates over the time period, producing values of time series"""
+        if len(self) == 0:
+            return
+        default = self.datatype()
+        if self._origin is None:
+            for _ in range(len(self)):
+                yield default
+            return
+        start = self._first - self._origin
+        end = self._last - self._origin + 1
+        if not self.keep_last_value:
+            # assigned intervals hold values, the rest hold zero
+            for _ in range(start, min(end, 0)):
+                yield default
+            yield from self._data[max(start, 0):max(end, 0)]
+            for _ in range(max(start, len(self._data)), end):
+                yield default
+            return
+        last_value = default
+        for index in range(start, end):
+            if 0 <= index < len(self._data) and self._present[index]:
+                last_value = self._data[index]
+            yield last_value
+
+    def value_array(self):
+        """Returns an array of the values over the whole time period"""
+        if self.keep_last_value or self._origin is None:
+            return array.array(self._data.typecode, self.values())
+        start = self._first - self._origin
+        end = self._last - self._origin + 1
+        itemsize = self._data.itemsize
+        # pad with zeros where the time period extends past stored values
+        values = array.array(
+            self._data.typecode,
+            bytes(max(min(end, 0) - start, 0) * itemsize)
+        )
+        values.extend(self._data[max(start, 0):max(end, 0)])
+        values.frombytes(
+            bytes(max(end - max(start, len(self._data)), 0) * itemsize)
+        )
+        return values
+
+    @classmethod
+    def from_buckets(cls, buckets, values, first=None, last=None, **kwargs):
+        obj = cls(**kwargs)
+        obj._fill(buckets, values)
+        obj._first = first
+        obj._last = last
+        return obj
+
+    def _fill(self, buckets, values):
+        """Stores [values] at the distinct interval indices [buckets]"""
+        if not len(buckets):
+            return
+        # allocate the whole range at once
+        self._grow(min(buckets))
+        self._grow(max(buckets))
+        origin = self._origin
+        data = self._data
+        present = self._present
+        for bucket, value in zip(buckets, values):
+            data[bucket - origin] = value
+            present[bucket - origin] = 1
+        self._version += 1
+
+    def sum(self):
+        """Returns the sum of all values in the time series"""
+        return sum(self._data)
+
+    def repr_json(self):
+        result = super().repr_json()
+        result["values"] = [
+            (self.bucket_time(self._origin + index), value)
+            for index, value in enumerate(self._data)
+            if self._present[index]
+        ]
+        return result
+
+    @classmethod
+    def from_json(cls, data):
+        datatype = int
+        if len(data["values"]):
+            datatype = data["values"][0][1].__class__
+        obj = cls(
+            interval=data["interval"],
+            datatype=datatype,
+            keep_last_value=data["keep_last_value"],
+            epoch=data.get("epoch")
+        )
+        bucket = obj.bucket
+        obj._fill(
+            [bucket(ts) for ts, _ in data["values"]],
+            [value for _, value in data["values"]]
+        )
+        obj.first_timestamp = data["first_timestamp"]
+        obj.last_timestamp = data["last_timestamp"]
+        return obj